@@ -9,23 +9,13 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import os
 import asyncio
 import logging
-from slack_bolt import App
-from slack_bolt.adapter.socket_mode import SocketModeHandler
-from apscheduler.schedulers.background import BackgroundScheduler
-from dotenv import load_dotenv
+from slack_bolt.async_app import AsyncApp
+from slack_bolt.adapter.socket_mode.aiohttp import AsyncSocketModeHandler
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from config import Config
-from handlers.inference_handler import InferenceHandler, setup_inference_handlers
-from handlers.deal_handler import DealHandler, setup_deal_handlers
-from handlers.balance_handler import BalanceHandler, setup_balance_handlers
-from handlers.common_handlers import CommonHandlers, setup_common_handlers
-from handlers.simulator_integration_handler import setup_simulator_integration_handlers
-from schedulers.periodic_inference import PeriodicInference
 from utils.error_handler import ErrorHandler
 
-# 環境変数のロード
-load_dotenv()
-
 # ログ設定
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -33,24 +23,32 @@ logger = logging.getLogger(__name__)
 class ForexSlackBot:
     def __init__(self):
         """Forex Slack Botの初期化"""
-        self.app = App(token=Config.SLACK_BOT_TOKEN)
-        self.scheduler = BackgroundScheduler()
-        
-        # ハンドラの初期化
-        self.inference_handler = InferenceHandler()
-        self.deal_handler = DealHandler()
-        self.balance_handler = BalanceHandler()
-        self.common_handlers = CommonHandlers()
-        self.periodic_inference = PeriodicInference()
+        self.app = AsyncApp(token=Config.SLACK_BOT_TOKEN)
+        # スケジューラーはBoltと同じイベントループ上で生成する（_start_async参照）
+        self.scheduler = None
+        self.periodic_inference = None
         
         # エラーハンドラの設定
         self.error_handler = ErrorHandler()
         
         self._register_handlers()
-        self._setup_scheduler()
 
     def _register_handlers(self):
-        """イベントハンドラの登録"""
+        """
+        ハンドラの初期化とイベントハンドラの登録
+        ハンドラモジュールは重い依存を引き込むためここで遅延インポートする
+        """
+        from handlers.inference_handler import InferenceHandler, setup_inference_handlers
+        from handlers.deal_handler import DealHandler, setup_deal_handlers
+        from handlers.balance_handler import BalanceHandler, setup_balance_handlers
+        from handlers.common_handlers import CommonHandlers, setup_common_handlers
+        from handlers.simulator_integration_handler import setup_simulator_integration_handlers
+
+        self.inference_handler = InferenceHandler()
+        self.deal_handler = DealHandler()
+        self.balance_handler = BalanceHandler()
+        self.common_handlers = CommonHandlers()
+
         setup_inference_handlers(self.app)
         setup_deal_handlers(self.app, self.deal_handler, self.error_handler)
         setup_balance_handlers(self.app, self.balance_handler, self.error_handler)
@@ -58,8 +56,11 @@ class ForexSlackBot:
         setup_simulator_integration_handlers(self.app, self.error_handler)
 
     def _setup_scheduler(self):
-        """定期実行処理のスケジューリング設定"""
+        """定期実行処理のスケジューリング設定（実行中のイベントループに紐付ける）"""
+        self.scheduler = AsyncIOScheduler(event_loop=asyncio.get_running_loop())
         if Config.PERIODIC_INFERENCE_ENABLED:
+            from schedulers.periodic_inference import PeriodicInference
+            self.periodic_inference = PeriodicInference()
             self.scheduler.add_job(
                 func=self.periodic_inference.run_periodic_inference,
                 trigger="interval",
@@ -71,16 +72,27 @@ class ForexSlackBot:
     def start(self):
         """Slack Botの開始"""
         logger.info("Slack Botを開始します...")
+        # uvloopが利用可能ならlibuvベースのイベントループを使用（Windows等では標準asyncio）
+        try:
+            import uvloop
+            uvloop.install()
+        except ImportError:
+            pass
+        asyncio.run(self._start_async())
+
+    async def _start_async(self):
+        """スケジューラーとSocket Modeハンドラを同一イベントループ上で起動"""
+        self._setup_scheduler()
         if Config.PERIODIC_INFERENCE_ENABLED:
             self.scheduler.start()
             logger.info("定期実行スケジューラーを開始しました")
-        handler = SocketModeHandler(self.app, Config.SLACK_APP_TOKEN)
-        handler.start()
+        handler = AsyncSocketModeHandler(self.app, Config.SLACK_APP_TOKEN)
+        await handler.start_async()
 
     def stop(self):
         """Slack Botの停止"""
         logger.info("Slack Botを停止します...")
-        if self.scheduler.running:
+        if self.scheduler is not None and self.scheduler.running:
             self.scheduler.shutdown()
             logger.info("定期実行スケジューラーを停止しました")
 
@@ -30,7 +30,8 @@ def check_dependencies():
         "aiohttp",
         "apscheduler",
         "pandas",
-        "numpy"
+        "numpy",
+        "orjson"
     ]
     
     missing_packages = []
@@ -84,8 +85,18 @@ def check_file_structure():
     
     missing_files = []
     
+    # ディレクトリごとに一度だけ scandir して存在確認（ファイル毎の stat を避ける）
+    dir_entries = {}
     for file_path in required_files:
-        if os.path.exists(file_path):
+        dir_name, file_name = os.path.split(file_path)
+        if dir_name not in dir_entries:
+            try:
+                with os.scandir(dir_name or ".") as it:
+                    dir_entries[dir_name] = {entry.name for entry in it}
+            except OSError:
+                dir_entries[dir_name] = set()
+        
+        if file_name in dir_entries[dir_name]:
             print(f"✅ {file_path}")
         else:
             print(f"❌ {file_path} が見つかりません")
@@ -3,6 +3,7 @@
 """
 
 import os
+from pathlib import Path
 from typing import Optional
 from dotenv import load_dotenv
 
@@ -23,8 +24,11 @@ class Config:
     
     # データファイルパス
     DATA_DIR: str = os.getenv("DATA_DIR", "./data")
-    BALANCE_FILE: str = os.path.join(DATA_DIR, "balance.json")
-    TRANSACTION_LOG_FILE: str = os.path.join(DATA_DIR, "transaction_log.json")
+    BALANCE_FILE: Path = Path(DATA_DIR) / "balance.json"
+    # 取引ログは1行1レコードの追記型（JSONL）
+    TRANSACTION_LOG_FILE: Path = Path(DATA_DIR) / "transaction_log.jsonl"
+    # ライブの取引ログに残す最大件数（超えたら古い半分を月別のgzipアーカイブへ移す）
+    MAX_LIVE_TRANSACTIONS: int = int(os.getenv("MAX_LIVE_TRANSACTIONS", "10000"))
     
     # 推論モデル関連設定
     MODEL_PATH: str = os.getenv("MODEL_PATH", "./models")
@@ -46,10 +50,11 @@ class Config:
     
     # 取引設定
     INITIAL_BALANCE_JPY: float = float(os.getenv("INITIAL_BALANCE_JPY", "1000000.0"))
-    SUPPORTED_CURRENCIES: list = ["JPY", "USD", "EUR"]
+    # 表示順を保つためタプル（イミュータブル）で保持
+    SUPPORTED_CURRENCIES: tuple = ("JPY", "USD", "EUR")
     
     # セキュリティ設定
-    ADMIN_USER_IDS: list = os.getenv("ADMIN_USER_IDS", "").split(",") if os.getenv("ADMIN_USER_IDS") else []
+    ADMIN_USER_IDS: frozenset = frozenset(filter(None, os.getenv("ADMIN_USER_IDS", "").split(",")))
     
     # ログ設定
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
@@ -87,7 +92,11 @@ class Config:
             "data_dir": cls.DATA_DIR,
             "periodic_inference_enabled": cls.PERIODIC_INFERENCE_ENABLED,
             "periodic_inference_interval_hours": cls.PERIODIC_INFERENCE_INTERVAL_HOURS,
-            "supported_currencies": cls.SUPPORTED_CURRENCIES,
+            "supported_currencies": list(cls.SUPPORTED_CURRENCIES),
             "initial_balance_jpy": cls.INITIAL_BALANCE_JPY,
             "log_level": cls.LOG_LEVEL,
-        }
\ No newline at end of file
+        }
+
+
+# データディレクトリはインポート時に一度だけ作成しておく
+os.makedirs(Config.DATA_DIR, exist_ok=True)
@@ -9,23 +9,27 @@ logger = logging.getLogger(__name__)
 
 class CommonHandlers:
     """共通機能のハンドラクラス"""
+
+    __slots__ = ("_help_text",)
+    
+    def __init__(self):
+        # ヘルプ内容はConfigのみに依存するため起動時に一度だけ生成
+        self._help_text = self._generate_help_text()
     
-    def handle_help(self, respond, command):
+    async def handle_help(self, respond, command):
         """
         !help コマンドの処理
         利用可能なコマンドの一覧を表示
         """
         try:
-            help_text = self._generate_help_text()
-            
-            respond({
-                "text": help_text,
+            await respond({
+                "text": self._help_text,
                 "response_type": "ephemeral"
             })
             
         except Exception as e:
             logger.error(f"ヘルプ表示中にエラーが発生: {e}")
-            respond({
+            await respond({
                 "text": f"❌ ヘルプ表示中にエラーが発生しました: {str(e)}",
                 "response_type": "ephemeral"
             })
@@ -91,9 +95,9 @@ def setup_common_handlers(app, common_handlers, error_handler):
     共通ハンドラーを設定
     """
     @app.command("/help")
-    def handle_help_command(ack, respond, command):
-        ack()
+    async def handle_help_command(ack, respond, command):
+        await ack()
         try:
-            common_handlers.handle_help(respond, command)
+            await common_handlers.handle_help(respond, command)
         except Exception as e:
-            error_handler.handle_error(respond, e, "ヘルプコマンドの実行中")
\ No newline at end of file
+            await error_handler.handle_error(respond, e, "ヘルプコマンドの実行中")
\ No newline at end of file
@@ -3,20 +3,37 @@
 """
 
 import logging
-import re
 from typing import List, Optional
 
-from services.trading_service import TradingService
-from utils.slack_utils import SlackUtils
+from services import get_trading_service
+from utils.slack_utils import get_slack_utils, is_dm_channel_id
 
 logger = logging.getLogger(__name__)
 
+# deal-log の表ヘッダ
+_LOG_HEADER = ("日時                 | 通貨ペア | 金額      | レート   | 種別", "-" * 60)
+
+def _is_decimal(text: str) -> bool:
+    """
+    "123" または "123.45" 形式の数値文字列かどうかを判定（符号・指数表記は不可）
+    """
+    whole, dot, frac = text.partition(".")
+    return whole.isdecimal() and (not dot or frac.isdecimal())
+
+def _is_word(text: str) -> bool:
+    """
+    英数字とアンダースコアだけからなる文字列かどうかを判定（正規表現の単語文字と同じ判定）
+    """
+    return bool(text) and all(c.isalnum() or c == "_" for c in text)
+
 class DealHandler:
     """取引コマンドのハンドラクラス"""
+
+    __slots__ = ("trading_service", "slack_utils")
     
     def __init__(self):
-        self.trading_service = TradingService()
-        self.slack_utils = SlackUtils()
+        self.trading_service = get_trading_service()
+        self.slack_utils = get_slack_utils()
     
     async def handle_deal(self, respond, command):
         """
@@ -29,7 +46,7 @@ class DealHandler:
             # コマンドをパース
             parsed_params = self._parse_deal_command(text)
             if not parsed_params:
-                respond({
+                await respond({
                     "text": "❌ コマンド形式が正しくありません。\n使用方法: `/deal {通貨ペア} {±金額} {レート}`\n例: `/deal USDJPY +300 172.4`",
                     "response_type": "ephemeral"
                 })
@@ -49,32 +66,32 @@ class DealHandler:
             if result["success"]:
                 # 成功時のレスポンス
                 balance_text = self._format_balance_summary(result["new_balance"])
-                respond({
+                await respond({
                     "text": f"✅ 取引が完了しました！\n\n📈 取引詳細:\n{currency_pair}: {'+' if amount > 0 else ''}{amount} @ {rate}\n\n💰 更新後の残高:\n{balance_text}",
                     "response_type": "in_channel"
                 })
             else:
                 # 失敗時のレスポンス
-                respond({
+                await respond({
                     "text": f"❌ 取引に失敗しました: {result['error']}",
                     "response_type": "ephemeral"
                 })
                 
         except Exception as e:
-            logger.error(f"取引コマンド処理中にエラーが発生: {e}")
-            respond({
+            logger.error("取引コマンド処理中にエラーが発生: %s", e)
+            await respond({
                 "text": f"❌ 取引処理中にエラーが発生しました: {str(e)}",
                 "response_type": "ephemeral"
             })
     
-    def handle_deal_log(self, respond, command):
+    async def handle_deal_log(self, respond, command):
         """
         !deal-log コマンドの処理（DMのみに応答）
         """
         try:
             # DMかどうかをチェック
             if not self._is_direct_message(command):
-                respond({
+                await respond({
                     "text": "🔒 取引ログはDM（ダイレクトメッセージ）でのみ確認できます。",
                     "response_type": "ephemeral"
                 })
@@ -84,7 +101,7 @@ class DealHandler:
             transaction_logs = self.trading_service.get_transaction_logs()
             
             if not transaction_logs:
-                respond({
+                await respond({
                     "text": "📝 取引ログはまだありません。",
                     "response_type": "ephemeral"
                 })
@@ -93,19 +110,19 @@ class DealHandler:
             # ログをフォーマット
             log_text = self._format_transaction_logs(transaction_logs)
             
-            respond({
+            await respond({
                 "text": f"📊 取引ログ:\n```\n{log_text}\n```",
                 "response_type": "ephemeral"
             })
             
         except Exception as e:
-            logger.error(f"取引ログ取得中にエラーが発生: {e}")
-            respond({
+            logger.error("取引ログ取得中にエラーが発生: %s", e)
+            await respond({
                 "text": f"❌ 取引ログ取得中にエラーが発生しました: {str(e)}",
                 "response_type": "ephemeral"
             })
     
-    def handle_deal_undo(self, respond, command):
+    async def handle_deal_undo(self, respond, command):
         """
         !deal-undo コマンドの処理
         最新の取引を無かったことにする
@@ -114,28 +131,28 @@ class DealHandler:
             user_id = command.get("user_id")
             
             # 取引を取り消し
-            result = self.trading_service.undo_last_transaction(user_id)
+            result = await self.trading_service.undo_last_transaction(user_id)
             
             if result["success"]:
                 balance_text = self._format_balance_summary(result["new_balance"])
-                respond({
+                await respond({
                     "text": f"↩️ 最新の取引を取り消しました。\n\n📊 取り消された取引:\n{result['undone_transaction']}\n\n💰 更新後の残高:\n{balance_text}",
                     "response_type": "in_channel"
                 })
             else:
-                respond({
+                await respond({
                     "text": f"❌ 取引の取り消しに失敗しました: {result['error']}",
                     "response_type": "ephemeral"
                 })
                 
         except Exception as e:
-            logger.error(f"取引取り消し中にエラーが発生: {e}")
-            respond({
+            logger.error("取引取り消し中にエラーが発生: %s", e)
+            await respond({
                 "text": f"❌ 取引取り消し中にエラーが発生しました: {str(e)}",
                 "response_type": "ephemeral"
             })
     
-    def handle_deal_redo(self, respond, command):
+    async def handle_deal_redo(self, respond, command):
         """
         !deal-redo コマンドの処理
         undoした内容をもう一度実行する
@@ -144,23 +161,23 @@ class DealHandler:
             user_id = command.get("user_id")
             
             # 取引をやり直し
-            result = self.trading_service.redo_last_transaction(user_id)
+            result = await self.trading_service.redo_last_transaction(user_id)
             
             if result["success"]:
                 balance_text = self._format_balance_summary(result["new_balance"])
-                respond({
+                await respond({
                     "text": f"↪️ 取引をやり直しました。\n\n📊 やり直した取引:\n{result['redone_transaction']}\n\n💰 更新後の残高:\n{balance_text}",
                     "response_type": "in_channel"
                 })
             else:
-                respond({
+                await respond({
                     "text": f"❌ 取引のやり直しに失敗しました: {result['error']}",
                     "response_type": "ephemeral"
                 })
                 
         except Exception as e:
-            logger.error(f"取引やり直し中にエラーが発生: {e}")
-            respond({
+            logger.error("取引やり直し中にエラーが発生: %s", e)
+            await respond({
                 "text": f"❌ 取引やり直し中にエラーが発生しました: {str(e)}",
                 "response_type": "ephemeral"
             })
@@ -170,16 +187,20 @@ class DealHandler:
         !deal コマンドのパラメータをパース
         戻り値: (currency_pair, amount, rate) または None
         """
-        # 正規表現でパラメータを抽出
-        pattern = r'^(\w+)\s+([\+\-]?\d+(?:\.\d+)?)\s+(\d+(?:\.\d+)?)$'
-        match = re.match(pattern, text)
+        # 空白区切りで {通貨ペア} {±金額} {レート} の3トークンを取り出す
+        tokens = text.split()
+        if len(tokens) != 3:
+            return None
         
-        if not match:
+        pair, amount_str, rate_str = tokens
+        unsigned_amount = amount_str[1:] if amount_str[0] in "+-" else amount_str
+        # 通貨ペアは英数字とアンダースコア（旧来の正規表現の \w と同じ。例: USD_JPY）
+        if not _is_word(pair) or not _is_decimal(unsigned_amount) or not _is_decimal(rate_str):
             return None
         
-        currency_pair = match.group(1).upper()
-        amount = float(match.group(2))
-        rate = float(match.group(3))
+        currency_pair = pair.upper()
+        amount = float(amount_str)
+        rate = float(rate_str)
         
         return currency_pair, amount, rate
     
@@ -187,25 +208,19 @@ class DealHandler:
         """
         DMかどうかを判定
         """
-        channel_name = command.get("channel_name", "")
-        return channel_name.startswith("D") or channel_name == "directmessage"
+        return is_dm_channel_id(command.get("channel_id"))
     
     def _format_balance_summary(self, balance: dict) -> str:
         """
         残高を見やすくフォーマット
         """
-        lines = []
-        for currency, amount in balance.items():
-            lines.append(f"{currency}: {amount:,.2f}")
-        return "\n".join(lines)
+        return "\n".join(f"{currency}: {amount:,.2f}" for currency, amount in balance.items())
     
     def _format_transaction_logs(self, logs: List[dict]) -> str:
         """
         取引ログを見やすくフォーマット
         """
-        lines = []
-        lines.append("日時                 | 通貨ペア | 金額      | レート   | 種別")
-        lines.append("-" * 60)
+        lines = [*_LOG_HEADER]
         
         for log in logs[-20:]:  # 最新20件のみ表示
             timestamp = log.get("timestamp", "")
@@ -225,39 +240,33 @@ def setup_deal_handlers(app, deal_handler, error_handler):
     取引関連のハンドラーを設定
     """
     @app.command("/deal")
-    def handle_deal_command(ack, respond, command):
-        ack()
+    async def handle_deal_command(ack, respond, command):
+        await ack()
         try:
-            import asyncio
-            try:
-                loop = asyncio.get_event_loop()
-            except RuntimeError:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-            loop.run_until_complete(deal_handler.handle_deal(respond, command))
+            await deal_handler.handle_deal(respond, command)
         except Exception as e:
-            error_handler.handle_error(respond, e, "取引コマンドの実行中")
+            await error_handler.handle_error(respond, e, "取引コマンドの実行中")
 
     @app.command("/deal-log")
-    def handle_deal_log_command(ack, respond, command):
-        ack()
+    async def handle_deal_log_command(ack, respond, command):
+        await ack()
         try:
-            deal_handler.handle_deal_log(respond, command)
+            await deal_handler.handle_deal_log(respond, command)
         except Exception as e:
-            error_handler.handle_error(respond, e, "取引ログコマンドの実行中")
+            await error_handler.handle_error(respond, e, "取引ログコマンドの実行中")
 
     @app.command("/deal-undo")
-    def handle_deal_undo_command(ack, respond, command):
-        ack()
+    async def handle_deal_undo_command(ack, respond, command):
+        await ack()
         try:
-            deal_handler.handle_deal_undo(respond, command)
+            await deal_handler.handle_deal_undo(respond, command)
         except Exception as e:
-            error_handler.handle_error(respond, e, "取引取り消しコマンドの実行中")
+            await error_handler.handle_error(respond, e, "取引取り消しコマンドの実行中")
 
     @app.command("/deal-redo")
-    def handle_deal_redo_command(ack, respond, command):
-        ack()
+    async def handle_deal_redo_command(ack, respond, command):
+        await ack()
         try:
-            deal_handler.handle_deal_redo(respond, command)
+            await deal_handler.handle_deal_redo(respond, command)
         except Exception as e:
-            error_handler.handle_error(respond, e, "取引やり直しコマンドの実行中")
\ No newline at end of file
+            await error_handler.handle_error(respond, e, "取引やり直しコマンドの実行中")
\ No newline at end of file
@@ -2,24 +2,58 @@
 推論ハンドラ - !inference コマンド処理（実取引データ専用）
 """
 
+import asyncio
+import io
 import logging
 from datetime import datetime
+from typing import Optional
 
-from services.inference_service import InferenceService
-from services.trading_service import TradingService
-from utils.slack_utils import SlackUtils
+from services import get_inference_service, get_trading_service
+from utils.slack_utils import get_slack_utils, is_dm_channel_id
 
 logger = logging.getLogger(__name__)
 
+# 推論結果レポートの定型部分
+_HEADER = "\n".join(("=" * 50, "📊 実取引データ為替推論結果", "=" * 50))
+_DISCLAIMER = "\n".join((
+    "=" * 50,
+    "⚠️  重要な注意事項",
+    "=" * 50,
+    "• この推論結果は実際の取引データに基づく分析ですが、",
+    "  投資助言ではありません",
+    "• 為替取引にはリスクが伴います",
+    "• 取引の判断は自己責任で行ってください",
+    "• 過去の実績が将来の結果を保証するものではありません",
+))
+# (結果キー, 見出し) の順に本文セクションを出力
+_SECTIONS = (
+    ("market_analysis", "📈 市場分析:"),
+    ("risk_assessment", "⚠️ リスク評価:"),
+    ("real_data_summary", "🔍 実取引データ分析:"),
+)
+
+
+def _log_unhandled_inference_error(task: asyncio.Task) -> None:
+    """
+    バックグラウンド推論で捕捉されなかった例外をログに残す（結果を待つ呼び出し元がいないため）
+    """
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("バックグラウンド推論で未処理の例外が発生しました: %r", task.exception())
+
+
 class InferenceHandler:
     """推論コマンドのハンドラクラス（実取引データ専用）"""
+
+    __slots__ = ("inference_service", "trading_service", "slack_utils", "_tasks")
     
     def __init__(self):
-        self.inference_service = InferenceService()
-        self.trading_service = TradingService()
-        self.slack_utils = SlackUtils()
+        self.inference_service = get_inference_service()
+        self.trading_service = get_trading_service()
+        self.slack_utils = get_slack_utils()
+        # 実行中の推論タスク（イベントループは弱参照しか持たないため、完了までここで参照を保持する）
+        self._tasks = set()
         
-    def handle_inference(self, respond, command):
+    async def handle_inference(self, respond, command):
         """
         !inference コマンドの処理
         - 実際の取引データを使用した推論のみ実行
@@ -31,176 +65,157 @@ class InferenceHandler:
         user_id = command.get("user_id")
         channel_id = command.get("channel_id")
         command_text = command.get("text", "").strip()
-        logger.info(f"handle_inference called: user_id={user_id}, channel_id={channel_id}, text={command_text}")
+        logger.info("handle_inference called: user_id=%s, channel_id=%s, text=%s", user_id, channel_id, command_text)
         try:
-            # 推論が既に実行中かチェック
-            if self.inference_service.is_inference_running():
-                respond({
+            # 推論の実行権を取得（既に実行中なら取得できない）
+            if not await self.inference_service.try_acquire_inference():
+                await respond({
                     "text": "🔄 すでに推論が実行中です。完了までお待ちください。",
                     "response_type": "ephemeral"
                 })
                 return
-            # 開始メッセージ
-            respond({
-                "text": "🚀 実取引データを使用した推論を開始しました。完了次第、結果をお知らせします。",
-                "response_type": "in_channel"
-            })
-            # バックグラウンドで推論を実行
-            import threading
-            threading.Thread(target=self._run_inference_sync, args=(channel_id, user_id)).start()
+            try:
+                # 開始メッセージ
+                await respond({
+                    "text": "🚀 実取引データを使用した推論を開始しました。完了次第、結果をお知らせします。",
+                    "response_type": "in_channel"
+                })
+                # Boltと同じイベントループ上のタスクとして推論を実行（コマンド処理はすぐに返す）
+                task = asyncio.create_task(self._run_inference_async(channel_id, user_id))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+                task.add_done_callback(_log_unhandled_inference_error)
+            except Exception:
+                # 推論を開始できなかった場合は実行権を解放
+                self.inference_service.reset_inference_state()
+                raise
         except Exception as e:
-            logger.error(f"handle_inferenceで例外: {e}")
-            respond({
+            logger.error("handle_inferenceで例外: %s", e)
+            await respond({
                 "text": f"❌ 推論コマンド実行時にエラーが発生しました: {str(e)}",
                 "response_type": "ephemeral"
             })
 
-    def _run_inference_sync(self, channel_id, user_id):
+    async def _run_inference_async(self, channel_id, user_id):
         """
-        バックグラウンドでの実取引データ推論実行
+        バックグラウンドでの実取引データ推論実行（Boltのイベントループ上のタスクとして実行される）
         """
         try:
-            logger.info(f"実取引データ推論を開始します。ユーザー: {user_id}, チャンネル: {channel_id}")
+            logger.info("実取引データ推論を開始します。ユーザー: %s, チャンネル: %s", user_id, channel_id)
             
-            # 現在の残高を取得
-            current_balance = self.trading_service.get_current_balance()
+            # 現在の残高を取得（ファイル読み込みを伴うのでワーカースレッドで行う）
+            current_balance = await asyncio.to_thread(self.trading_service.get_current_balance)
             
             # 実取引データ推論を実行
-            import asyncio
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            inference_result = loop.run_until_complete(
-                self.inference_service.run_inference(current_balance)
-            )
+            inference_result = await self.inference_service.run_inference(current_balance, acquired=True)
             
             # 結果をフォーマット
-            result_text = self._format_inference_result(inference_result)
-            
-            import tempfile
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False, encoding='utf-8') as f:
-                f.write(result_text)
-                temp_file_path = f.name
+            # レポートの実行日時とファイル名で同じ時刻を使う
+            now = datetime.now()
+            result_text = self._format_inference_result(inference_result, now=now)
             
-            filename = f"inference_result_real_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+            filename = f"inference_result_real_data_{now:%Y%m%d_%H%M%S}.txt"
             
-            logger.info(f"推論結果送信先チェック: channel_id={channel_id}, user_id={user_id}")
+            logger.info("推論結果送信先チェック: channel_id=%s, user_id=%s", channel_id, user_id)
             # DMチャンネルの場合はファイル添付不可のためテキストのみ送信
-            if channel_id and channel_id.startswith("D"):
+            if is_dm_channel_id(channel_id):
                 logger.info("DMチャンネルのためテキストのみ送信します")
-                msg_result = loop.run_until_complete(self.slack_utils.send_message(
+                msg_result = await self.slack_utils.send_message(
                     channel_id=channel_id,
                     text="✅ 実取引データ推論が完了しました！結果をご確認ください。\n\n" + result_text
-                ))
-                logger.info(f"send_message(DMテキスト)結果: {msg_result}")
+                )
+                logger.info("send_message(DMテキスト)結果: %r", msg_result)
             elif not channel_id or channel_id == "channel_not_found":
-                logger.warning(f"channel_idが不正のためDM送信を試みます: user_id={user_id}")
-                dm_result = loop.run_until_complete(self.slack_utils.send_dm(
+                logger.warning("channel_idが不正のためDM送信を試みます: user_id=%s", user_id)
+                dm_result = await self.slack_utils.send_dm(
                     user_id=user_id,
                     text="✅ 実取引データ推論が完了しました！結果をご確認ください。\n(チャンネルIDが不明なためDMで送信)\n\n" + result_text
-                ))
-                logger.info(f"send_dm(結果テキスト)結果: {dm_result}")
+                )
+                logger.info("send_dm(結果テキスト)結果: %r", dm_result)
             else:
-                # パブリックチャンネル等はファイル添付
-                file_result = loop.run_until_complete(self.slack_utils.send_message_with_file(
+                # パブリックチャンネル等はファイル添付（一時ファイルを作らずメモリ上から送信）
+                file_result = await self.slack_utils.send_message_with_file(
                     channel_id=channel_id,
                     text="✅ 実取引データ推論が完了しました！結果をご確認ください。",
-                    file_path=temp_file_path,
-                    filename=filename
-                ))
-                logger.info(f"send_message_with_file結果: {file_result}")
+                    filename=filename,
+                    file_obj=io.BytesIO(result_text.encode("utf-8"))
+                )
+                logger.info("send_message_with_file結果: %r", file_result)
             logger.info("実取引データ推論が正常に完了しました")
         except Exception as e:
-            logger.error(f"推論実行中にエラーが発生しました: {e}")
+            logger.error("推論実行中にエラーが発生しました: %s", e)
             error_message = self._get_error_message(e)
-            if channel_id and channel_id.startswith("D"):
+            if is_dm_channel_id(channel_id):
                 logger.info("DMチャンネルのためエラーメッセージもテキストのみ送信します")
-                msg_result = loop.run_until_complete(self.slack_utils.send_message(
+                msg_result = await self.slack_utils.send_message(
                     channel_id=channel_id,
                     text=f"❌ {error_message}"
-                ))
-                logger.info(f"send_message(DMエラー)結果: {msg_result}")
+                )
+                logger.info("send_message(DMエラー)結果: %r", msg_result)
             elif not channel_id or channel_id == "channel_not_found":
-                logger.warning(f"channel_idが不正のためDMでエラー送信を試みます: user_id={user_id}")
-                dm_result = loop.run_until_complete(self.slack_utils.send_dm(
+                logger.warning("channel_idが不正のためDMでエラー送信を試みます: user_id=%s", user_id)
+                dm_result = await self.slack_utils.send_dm(
                     user_id=user_id,
                     text=f"❌ {error_message}"
-                ))
-                logger.info(f"send_dm(エラー)結果: {dm_result}")
+                )
+                logger.info("send_dm(エラー)結果: %r", dm_result)
             else:
-                msg_result = loop.run_until_complete(self.slack_utils.send_message(
+                msg_result = await self.slack_utils.send_message(
                     channel_id=channel_id,
                     text=f"❌ {error_message}"
-                ))
-                logger.info(f"send_message(エラー)結果: {msg_result}")
+                )
+                logger.info("send_message(エラー)結果: %r", msg_result)
         finally:
             # 推論状態をリセット
             self.inference_service.reset_inference_state()
 
-    def _format_inference_result(self, result: dict) -> str:
+    def _format_inference_result(self, result: dict, now: Optional[datetime] = None) -> str:
         """
         推論結果をわかりやすいテキストにフォーマット（実取引データ専用）
+        now: 実行日時として表示する時刻（省略時は現在時刻）
         """
-        formatted_text = []
-        
+        if now is None:
+            now = datetime.now()
         data_source = result.get("data_source", "real_trading_data")
         
-        formatted_text.append("=" * 50)
-        formatted_text.append("📊 実取引データ為替推論結果")
-        formatted_text.append("=" * 50)
-        formatted_text.append(f"実行日時: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        formatted_text.append(f"データソース: {data_source}")
-        formatted_text.append("")
+        formatted_text = [
+            _HEADER,
+            f"実行日時: {now:%Y-%m-%d %H:%M:%S}",
+            f"データソース: {data_source}",
+            "",
+        ]
         
         # 推奨取引があれば表示
-        if result.get("recommended_trades"):
+        recommended_trades = result.get("recommended_trades")
+        if recommended_trades:
             formatted_text.append("💡 推奨取引:")
-            for trade in result["recommended_trades"]:
-                action = "買い" if trade.get("action") == "buy" else "売り"
-                confidence = trade.get("confidence", 0) * 100
-                formatted_text.append(f"  - {trade.get('pair')}: {action} {trade.get('amount')} @ {trade.get('rate')}")
-                formatted_text.append(f"    信頼度: {confidence:.0f}%")
-                if trade.get("reasoning"):
-                    formatted_text.append(f"    理由: {trade.get('reasoning')}")
+            for trade in recommended_trades:
+                action, pair, amount, rate, confidence, reasoning = (
+                    trade.get(k) for k in ("action", "pair", "amount", "rate", "confidence", "reasoning")
+                )
+                formatted_text.append(f"  - {pair}: {'買い' if action == 'buy' else '売り'} {amount} @ {rate}")
+                formatted_text.append(f"    信頼度: {(confidence or 0) * 100:.0f}%")
+                if reasoning:
+                    formatted_text.append(f"    理由: {reasoning}")
             formatted_text.append("")
         else:
-            formatted_text.append("💡 推奨取引: なし（現時点では取引を控えることを推奨）")
-            formatted_text.append("")
+            formatted_text.extend(("💡 推奨取引: なし（現時点では取引を控えることを推奨）", ""))
         
         # 現在の残高情報
-        if result.get("current_balance"):
+        current_balance = result.get("current_balance")
+        if current_balance:
             formatted_text.append("💰 現在の残高:")
-            for currency, amount in result["current_balance"].items():
-                formatted_text.append(f"  {currency}: {amount:,.2f}")
+            formatted_text.extend(f"  {currency}: {amount:,.2f}" for currency, amount in current_balance.items())
             formatted_text.append("")
         
-        # 市場分析
-        if result.get("market_analysis"):
-            formatted_text.append("📈 市場分析:")
-            formatted_text.append(result["market_analysis"])
-            formatted_text.append("")
-        
-        # リスク評価
-        if result.get("risk_assessment"):
-            formatted_text.append("⚠️ リスク評価:")
-            formatted_text.append(result["risk_assessment"])
-            formatted_text.append("")
-        
-        # 実取引データ特有の情報
-        if result.get("real_data_summary"):
-            formatted_text.append("🔍 実取引データ分析:")
-            formatted_text.append(result["real_data_summary"])
-            formatted_text.append("")
+        # 市場分析・リスク評価・実取引データ特有の情報
+        for key, title in _SECTIONS:
+            value = result.get(key)
+            if value:
+                formatted_text.extend((title, value, ""))
         
         # 免責事項
-        formatted_text.append("=" * 50)
-        formatted_text.append("⚠️  重要な注意事項")
-        formatted_text.append("=" * 50)
-        formatted_text.append("• この推論結果は実際の取引データに基づく分析ですが、")
-        formatted_text.append("  投資助言ではありません")
-        formatted_text.append("• 為替取引にはリスクが伴います")
-        formatted_text.append("• 取引の判断は自己責任で行ってください")
-        formatted_text.append("• 過去の実績が将来の結果を保証するものではありません")
+        formatted_text.append(_DISCLAIMER)
         
         return "\n".join(formatted_text)
     
@@ -231,8 +246,8 @@ def setup_inference_handlers(app):
     inference_handler = InferenceHandler()
     logger.info("setup_inference_handlers: /inference コマンドハンドラ登録開始")
     @app.command("/inference")
-    def handle_inference_command(ack, respond, command):
-        logger.info(f"/inferenceコマンド受信: command={command}")
-        ack()
-        inference_handler.handle_inference(respond, command)
+    async def handle_inference_command(ack, respond, command):
+        logger.info("/inferenceコマンド受信: command=%s", command)
+        await ack()
+        await inference_handler.handle_inference(respond, command)
     logger.info("実取引推論ハンドラが設定されました (/inference)")
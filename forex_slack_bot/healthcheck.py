@@ -7,37 +7,45 @@ import os
 import sys
 import time
 import logging
-from pathlib import Path
+
+# 毎回のプローブで Path を生成しないよう、確認するパスは文字列で持っておく
+DATA_DIR = "/app/data"
+ENV_FILE = "/app/.env"
+LOG_FILE = "/app/logs/app.log"
+SIMULATOR_PATH = "/mnt/bigdata/00_students/mattsun_ucl/workspace/forex/llm_forex_simulator"
+
+def _stat(path):
+    """os.stat の結果を返す（存在しなければ None）"""
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
 
 def check_health():
     """アプリケーションの健全性をチェック"""
     try:
         # 1. データディレクトリの存在確認
-        data_dir = Path("/app/data")
-        if not data_dir.exists():
+        if _stat(DATA_DIR) is None:
             print("❌ Data directory does not exist")
             return False
         
         # 2. 設定ファイルの存在確認
-        env_file = Path("/app/.env")
-        if not env_file.exists():
+        if _stat(ENV_FILE) is None:
             print("❌ .env file does not exist")
             return False
         
         # 3. プロセス健全性の簡易チェック
         # アプリケーションログの最終更新時間をチェック
-        log_file = Path("/app/logs/app.log")
-        if log_file.exists():
-            # ログファイルが30分以内に更新されているかチェック
-            last_modified = log_file.stat().st_mtime
+        log_stat = _stat(LOG_FILE)
+        if log_stat is not None:
+            # ログファイルが30分以内に更新されているかチェック（stat の結果を再利用）
             current_time = time.time()
-            if current_time - last_modified > 1800:  # 30分
+            if current_time - log_stat.st_mtime > 1800:  # 30分
                 print("⚠️  Log file not updated recently")
                 # ただし、これだけでは失敗とはしない
         
         # 4. LLMシミュレーターパスの確認
-        simulator_path = Path("/mnt/bigdata/00_students/mattsun_ucl/workspace/forex/llm_forex_simulator")
-        if not simulator_path.exists():
+        if _stat(SIMULATOR_PATH) is None:
             print("⚠️  LLM Simulator path not accessible (may be expected in container)")
         
         print("✅ Health check passed")
@@ -2,24 +2,53 @@
 残高マネージャ - 残高の読み込み/書き込み
 """
 
-import json
+import atexit
 import logging
 import os
+import shutil
 import threading
+from collections import deque
 from typing import Dict
 from datetime import datetime
 
+import orjson
+
 from config import Config
+from utils.flusher import DebouncedFlusher
 
 logger = logging.getLogger(__name__)
 
+# 保存用のシリアライズオプション（整形なし）
+_DUMP_OPTS = orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE
+
+# 残高履歴を末尾から読むときの1回あたりの読み込みサイズ
+HISTORY_TAIL_CHUNK = 64 * 1024
+
 class BalanceManager:
     """残高管理クラス"""
     
     def __init__(self):
-        self._lock = threading.Lock()
+        # 派生ファイルのパスは毎回組み立てず、ここで一度だけ作っておく
+        stem_path = str(Config.BALANCE_FILE.with_name(Config.BALANCE_FILE.stem))
+        # 残高履歴は1行1レコードの追記型（JSONL）
+        self._history_file = f"{stem_path}_history.jsonl"
+        self._backup_prefix = f"{stem_path}_backup_"
+        # 既存のバックアップ（古い順）。書き込みのたびにディレクトリを走査しないよう手元で管理する
+        self._backups = self._load_backup_registry()
+        self._tmp_file = f"{Config.BALANCE_FILE}.tmp"
+        # 更新（書き出し・バックアップ・復元）同士を排他にする。読み取りはロックを取らない
+        self._write_lock = threading.Lock()
+        # 書き出し待ちの最新残高 (残高, シリアライズ済みデータ)。連続した更新は最後の1件だけを書き出す
+        self._pending = None
+        self._pending_lock = threading.Lock()
+        # 直前の書き出しに失敗したか。失敗中は更新のたびに同期的に書き出し、結果を呼び出し元へ返す
+        self._write_failed = False
+        # 最後に読んだ残高ファイルの ((st_mtime_ns, st_size), 残高)。ファイルが変わらない限り再パースしない
+        self._cache = None
+        self._flusher = DebouncedFlusher(self.flush, name="balance-flusher")
         self._ensure_data_directory()
         self._ensure_balance_file()
+        atexit.register(self.flush)
     
     def get_balance(self) -> Dict[str, float]:
         """
@@ -28,74 +57,127 @@ class BalanceManager:
         Returns:
             通貨別残高の辞書
         """
-        with self._lock:
+        # 書き出し待ちの更新があればそれが最新
+        pending = self._pending
+        if pending is not None:
+            return self._complete_balances(dict(pending[0]))
+        
+        # 書き込みは一時ファイル + os.replace で行うので、ロックなしでも読み途中のファイルは見えない
+        try:
             try:
-                if not os.path.exists(Config.BALANCE_FILE):
-                    return self._get_initial_balance()
-                
-                with open(Config.BALANCE_FILE, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                # データの妥当性チェック
-                if not isinstance(data, dict):
-                    logger.warning("残高ファイルの形式が無効です。初期残高を返します。")
-                    return self._get_initial_balance()
-                
-                # 新形式（'balances'キーあり）と旧形式（直接通貨データ）の両方に対応
-                if 'balances' in data:
-                    balances = data['balances']
-                else:
-                    # 旧形式の場合、'last_updated'等のメタデータを除外して通貨データのみ取得
-                    balances = {k: v for k, v in data.items() 
-                              if k in Config.SUPPORTED_CURRENCIES or k.upper() in Config.SUPPORTED_CURRENCIES}
-                
-                # サポート対象通貨が全て含まれているかチェック
-                for currency in Config.SUPPORTED_CURRENCIES:
-                    if currency not in balances:
-                        balances[currency] = Config.INITIAL_BALANCE_JPY if currency == "JPY" else 0.0
-                
-                return balances
+                st = os.stat(Config.BALANCE_FILE)
+                key = (st.st_mtime_ns, st.st_size)
+                cache = self._cache
+                if cache is not None and cache[0] == key:
+                    return dict(cache[1])
                 
-            except (json.JSONDecodeError, FileNotFoundError) as e:
-                logger.error(f"残高ファイル読み込み中にエラー: {e}")
+                with open(Config.BALANCE_FILE, 'rb') as f:
+                    raw = f.read()
+            except FileNotFoundError:
                 return self._get_initial_balance()
-            except Exception as e:
-                logger.error(f"残高取得中に予期しないエラー: {e}")
+            
+            data = orjson.loads(raw)
+            
+            # データの妥当性チェック
+            if not isinstance(data, dict):
+                logger.warning("残高ファイルの形式が無効です。初期残高を返します。")
                 return self._get_initial_balance()
+            
+            # 新形式（'balances'キーあり）と旧形式（直接通貨データ）の両方に対応
+            if 'balances' in data:
+                balances = data['balances']
+            else:
+                # 旧形式の場合、'last_updated'等のメタデータを除外して通貨データのみ取得
+                balances = {k: v for k, v in data.items() 
+                          if k in Config.SUPPORTED_CURRENCIES or k.upper() in Config.SUPPORTED_CURRENCIES}
+            
+            balances = self._complete_balances(balances)
+            # 他プロセスの書き込みもキーの変化で検知できるので、書き込み側での無効化は不要
+            self._cache = (key, balances)
+            return dict(balances)
+            
+        except (orjson.JSONDecodeError, FileNotFoundError) as e:
+            logger.error(f"残高ファイル読み込み中にエラー: {e}")
+            return self._get_initial_balance()
+        except Exception as e:
+            logger.error(f"残高取得中に予期しないエラー: {e}")
+            return self._get_initial_balance()
+    
+    def _complete_balances(self, balances: Dict[str, float]) -> Dict[str, float]:
+        """
+        サポート対象通貨が全て含まれるよう不足分を補う
+        """
+        for currency in Config.SUPPORTED_CURRENCIES:
+            if currency not in balances:
+                balances[currency] = Config.INITIAL_BALANCE_JPY if currency == "JPY" else 0.0
+        
+        return balances
     
-    def update_balance(self, new_balance: Dict[str, float]) -> bool:
+    def update_balance(self, new_balance: Dict[str, float], durable: bool = False) -> bool:
         """
-        残高を更新
+        残高を更新（durable でなければファイルへの書き出しはバックグラウンドでまとめて行う）
         
         Args:
             new_balance: 新しい残高データ
+            durable: Trueの場合はここで書き出しまで行う（取引など、成功を報告する前に永続化が必要な更新）
             
         Returns:
-            更新成功の場合True
+            durable または直前の書き出しに失敗している場合は書き出しに成功した場合のみTrue、
+            それ以外は更新を受け付けた場合True
+        """
+        if not self._validate_balance_data(new_balance):
+            logger.error("無効な残高データです")
+            return False
+        
+        try:
+            # 残高データを準備
+            balance_data = {
+                "balances": new_balance,
+                "last_updated": datetime.now().isoformat(),
+                "version": "1.0"
+            }
+            payload = orjson.dumps(balance_data, option=_DUMP_OPTS)
+        except Exception as e:
+            logger.error(f"残高更新中にエラー: {e}")
+            return False
+        
+        pending = (dict(new_balance), payload)
+        with self._pending_lock:
+            previous = self._pending
+            self._pending = pending
+        
+        if not durable and not self._write_failed:
+            self._flusher.notify()
+            return True
+        
+        # 永続化が必要な更新や、直前の書き出しに失敗している場合は、ここで書き出して結果を確かめる
+        if self.flush():
+            return True
+        
+        # 書き出せなかった更新は取り下げ、以前の書き出し待ち（あれば次のフラッシュで再試行）に戻す
+        with self._pending_lock:
+            if self._pending is pending:
+                self._pending = previous
+        return False
+    
+    def flush(self) -> bool:
+        """
+        書き出し待ちの残高をファイルに書き込む（終了時や即時に永続化したい場合に使う）
+        
+        Returns:
+            書き出しに成功した（または書き出し待ちがなかった）場合True
         """
-        with self._lock:
+        with self._write_lock:
+            pending = self._pending
+            if pending is None:
+                return True
+            
             try:
-                # バリデーション
-                if not self._validate_balance_data(new_balance):
-                    logger.error("無効な残高データです")
-                    return False
-                
                 # バックアップを作成
                 self._create_backup()
                 
-                # 残高データを準備
-                balance_data = {
-                    "balances": new_balance,
-                    "last_updated": datetime.now().isoformat(),
-                    "version": "1.0"
-                }
-                
-                # ファイルに書き込み
-                with open(Config.BALANCE_FILE, 'w', encoding='utf-8') as f:
-                    json.dump(balance_data, f, indent=2, ensure_ascii=False)
-                
-                logger.info("残高を正常に更新しました")
-                return True
+                # 一時ファイルに書いてから置き換える（直前のファイルはバックアップのハードリンクとして残る）
+                self._replace_balance_file(pending[1])
                 
             except Exception as e:
                 logger.error(f"残高更新中にエラー: {e}")
@@ -107,7 +189,17 @@ class BalanceManager:
                 except Exception as backup_error:
                     logger.error(f"バックアップからの復元に失敗: {backup_error}")
                 
+                # 書き出せなかった残高は待ちに残し、次のフラッシュで再試行する
+                self._write_failed = True
                 return False
+            
+            logger.info("残高を正常に更新しました")
+            self._write_failed = False
+            # 書き出し中に新しい更新が来ていなければ待ちを解除（来ていれば次のフラッシュで書く）
+            with self._pending_lock:
+                if self._pending is pending:
+                    self._pending = None
+            return True
     
     def get_balance_history(self, limit: int = 10) -> list:
         """
@@ -120,16 +212,13 @@ class BalanceManager:
             残高変更履歴のリスト
         """
         try:
-            history_file = Config.BALANCE_FILE.replace('.json', '_history.json')
-            
-            if not os.path.exists(history_file):
+            try:
+                lines = self._read_history_tail(limit)
+            except FileNotFoundError:
                 return []
             
-            with open(history_file, 'r', encoding='utf-8') as f:
-                history = json.load(f)
-            
             # 最新のものから指定件数を取得
-            return history[-limit:] if isinstance(history, list) else []
+            return [orjson.loads(line) for line in lines[-limit:]]
             
         except Exception as e:
             logger.error(f"残高履歴取得中にエラー: {e}")
@@ -148,6 +237,7 @@ class BalanceManager:
         if not os.path.exists(Config.BALANCE_FILE):
             initial_balance = self._get_initial_balance()
             self.update_balance(initial_balance)
+            self.flush()
             logger.info("初期残高ファイルを作成しました")
     
     def _get_initial_balance(self) -> Dict[str, float]:
@@ -194,15 +284,22 @@ class BalanceManager:
         現在の残高ファイルのバックアップを作成
         """
         try:
-            if os.path.exists(Config.BALANCE_FILE):
-                backup_file = Config.BALANCE_FILE.replace('.json', f'_backup_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json')
-                
-                with open(Config.BALANCE_FILE, 'r', encoding='utf-8') as src:
-                    with open(backup_file, 'w', encoding='utf-8') as dst:
-                        dst.write(src.read())
-                
-                # 古いバックアップファイルを削除（最新5個まで保持）
-                self._cleanup_old_backups()
+            backup_file = f"{self._backup_prefix}{datetime.now():%Y%m%d_%H%M%S}.json"
+            
+            # 残高ファイルは常に置き換えで更新するので、内容をコピーせずハードリンクで現在の版を残す
+            try:
+                os.link(Config.BALANCE_FILE, backup_file)
+            except (FileNotFoundError, FileExistsError):
+                # 残高ファイルがまだ無い、または同じ秒のバックアップが既にある
+                return
+            except OSError:
+                # ハードリンク非対応のファイルシステムではコピーする
+                shutil.copy2(Config.BALANCE_FILE, backup_file)
+            
+            self._backups.append(backup_file)
+            
+            # 古いバックアップファイルを削除（最新5個まで保持）
+            self._cleanup_old_backups()
                 
         except Exception as e:
             logger.warning(f"バックアップ作成中にエラー: {e}")
@@ -211,70 +308,97 @@ class BalanceManager:
         """
         最新のバックアップから残高を復元
         """
-        backup_pattern = Config.BALANCE_FILE.replace('.json', '_backup_*.json')
-        import glob
-        
-        backup_files = glob.glob(backup_pattern)
-        if not backup_files:
+        if not self._backups:
             raise FileNotFoundError("バックアップファイルが見つかりません")
         
-        # 最新のバックアップファイルを取得
-        latest_backup = max(backup_files, key=os.path.getmtime)
+        # 登録済みの最新バックアップを使う（ディレクトリ走査・mtime比較は不要）
+        latest_backup = self._backups[-1]
+        
+        # バックアップ自体は残したいので、一時名にハードリンクしてから残高ファイルへ rename する
+        try:
+            os.link(latest_backup, self._tmp_file)
+        except FileExistsError:
+            os.remove(self._tmp_file)
+            os.link(latest_backup, self._tmp_file)
+        except OSError:
+            # ハードリンク非対応のファイルシステムではコピーする
+            shutil.copy2(latest_backup, self._tmp_file)
+        os.replace(self._tmp_file, Config.BALANCE_FILE)
+    
+    def _replace_balance_file(self, data: bytes):
+        """
+        一時ファイルに書き込んでから os.replace で残高ファイルをアトミックに置き換える
+        """
+        with open(self._tmp_file, 'wb') as f:
+            f.write(data)
+        os.replace(self._tmp_file, Config.BALANCE_FILE)
+    
+    def _load_backup_registry(self) -> deque:
+        """
+        起動時に一度だけディレクトリを走査し、既存のバックアップを古い順に並べる
+        """
+        directory, prefix = os.path.split(self._backup_prefix)
+        try:
+            with os.scandir(directory or ".") as it:
+                backups = [
+                    (entry.stat().st_mtime, entry.path)
+                    for entry in it
+                    if entry.name.startswith(prefix) and entry.name.endswith(".json")
+                ]
+        except FileNotFoundError:
+            return deque()
         
-        with open(latest_backup, 'r', encoding='utf-8') as src:
-            with open(Config.BALANCE_FILE, 'w', encoding='utf-8') as dst:
-                dst.write(src.read())
+        backups.sort()
+        return deque(path for _, path in backups)
     
     def _cleanup_old_backups(self, keep_count: int = 5):
         """
-        古いバックアップファイルを削除
+        古いバックアップファイルを削除（登録済みのバックアップを古い方から消す）
         """
         try:
-            backup_pattern = Config.BALANCE_FILE.replace('.json', '_backup_*.json')
-            import glob
-            
-            backup_files = glob.glob(backup_pattern)
-            if len(backup_files) <= keep_count:
-                return
-            
-            # 作成日時でソートし、古いものから削除
-            backup_files.sort(key=os.path.getmtime)
-            files_to_delete = backup_files[:-keep_count]
-            
-            for file_path in files_to_delete:
-                os.remove(file_path)
+            while len(self._backups) > keep_count:
+                file_path = self._backups.popleft()
+                try:
+                    os.remove(file_path)
+                except FileNotFoundError:
+                    pass
                 logger.debug(f"古いバックアップファイルを削除: {file_path}")
                 
         except Exception as e:
             logger.warning(f"バックアップファイル整理中にエラー: {e}")
     
+    def _read_history_tail(self, limit: int) -> list:
+        """
+        履歴ファイルの末尾から、少なくとも limit 行（ファイルが短ければ全行）を読み込む
+        """
+        with open(self._history_file, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            chunk = HISTORY_TAIL_CHUNK
+            while True:
+                offset = max(0, size - chunk)
+                f.seek(offset)
+                lines = f.read().splitlines()
+                if offset:
+                    # 途中から読んだ先頭行は欠けているので捨てる
+                    lines = lines[1:]
+                lines = [line for line in lines if line.strip()]
+                if not offset or len(lines) >= limit:
+                    return lines
+                chunk *= 2
+    
     def _save_balance_history(self, balance: Dict[str, float]):
         """
-        残高変更履歴を保存
+        残高変更履歴を保存（ファイル末尾に1行追記するだけで、既存の履歴は読み直さない）
         """
         try:
-            history_file = Config.BALANCE_FILE.replace('.json', '_history.json')
-            
-            # 既存の履歴を読み込み
-            history = []
-            if os.path.exists(history_file):
-                with open(history_file, 'r', encoding='utf-8') as f:
-                    history = json.load(f)
-            
-            # 新しい履歴エントリを追加
+            # orjson は辞書を読むだけなのでコピーは不要
             history_entry = {
                 "timestamp": datetime.now().isoformat(),
-                "balances": balance.copy()
+                "balances": balance
             }
-            history.append(history_entry)
-            
-            # 履歴数を制限（最新100件まで）
-            if len(history) > 100:
-                history = history[-100:]
             
-            # 履歴ファイルに保存
-            with open(history_file, 'w', encoding='utf-8') as f:
-                json.dump(history, f, indent=2, ensure_ascii=False)
+            with open(self._history_file, 'ab') as f:
+                f.write(orjson.dumps(history_entry, option=_DUMP_OPTS))
                 
         except Exception as e:
             logger.warning(f"残高履歴保存中にエラー: {e}")
@@ -2,25 +2,196 @@
 取引ログ - 取引ログの読み込み/書き込み
 """
 
-import json
+import atexit
+import bisect
+import glob
+import gzip
 import logging
+import mmap
 import os
+import shutil
+import sys
 import threading
+import time
 import uuid
-from typing import Dict, List, Optional, Any
-from datetime import datetime, timedelta
+from collections import Counter, defaultdict, deque
+from typing import Dict, List, Optional, Any, Tuple, NamedTuple
+from datetime import datetime
+from operator import itemgetter
+
+import orjson
+
+try:
+    import numpy as np
+except ImportError:  # numpy が無い環境では bisect で代用する
+    np = None
 
 from config import Config
+from utils.flusher import DebouncedFlusher
 
 logger = logging.getLogger(__name__)
 
+# JSONL移行前の取引ログ（初回起動時に取り込む）
+_LEGACY_LOG_FILE = Config.TRANSACTION_LOG_FILE.with_suffix(".json")
+
+# 取り消し済みマーク（墓標レコード）の比率がこれを超えたらファイルを詰め直す
+COMPACTION_THRESHOLD = 0.3
+
+# 保存用のシリアライズオプション（1レコード=1行、整形なし）
+_DUMP_OPTS = orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE
+
+# これ未満のサイズのファイルはmmapせず通常の読み込みを使う（ページ単位のオーバーヘッド回避）
+MMAP_MIN_SIZE = 64 * 1024
+
+# 比較・ソートにはISO文字列ではなく整数のエポックナノ秒（ts_ns）を使う
+_ts_ns_key = itemgetter("ts_ns")
+
+def _iso_to_ns(timestamp: Optional[str]) -> int:
+    """
+    ISO形式のタイムスタンプをエポックナノ秒に変換（無い・解析できない場合は0）
+    """
+    if not timestamp:
+        return 0
+    try:
+        dt = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return 0
+    return round(dt.timestamp() * 1_000_000) * 1000
+
+def _count_at_most(sorted_values, value: int) -> int:
+    """
+    昇順の列のうち value 以下の要素数を二分探索で求める
+    """
+    if np is not None:
+        return int(np.searchsorted(sorted_values, value, side="right"))
+    return bisect.bisect_right(sorted_values, value)
+
+def _compute_stats(logs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    取引ログの統計を集計
+    """
+    completed = 0
+    undone = 0
+    currency_pairs = set()
+    transaction_types = Counter()
+    earliest = None
+    latest = None
+    
+    for log in logs:
+        # ステータス別カウント
+        status = log.get("status", "")
+        if status == "完了":
+            completed += 1
+        elif status == "取り消し済み":
+            undone += 1
+        
+        # 通貨ペア・取引タイプ集計
+        pair = log.get("currency_pair")
+        if pair:
+            currency_pairs.add(pair)
+        transaction_types[log.get("type", "その他")] += 1
+        
+        # 日付範囲
+        if log["ts_ns"]:
+            if earliest is None or log["ts_ns"] < earliest["ts_ns"]:
+                earliest = log
+            if latest is None or log["ts_ns"] > latest["ts_ns"]:
+                latest = log
+    
+    return {
+        "total_transactions": len(logs),
+        "completed_transactions": completed,
+        "undone_transactions": undone,
+        "currency_pairs": list(currency_pairs),
+        "transaction_types": dict(transaction_types),
+        "date_range": {
+            "earliest": earliest["timestamp"] if earliest else None,
+            "latest": latest["timestamp"] if latest else None
+        }
+    }
+
+def _merge_stats(older: Dict[str, Any], newer: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    古い期間（アーカイブ）と新しい期間の統計を合算（新しい辞書を返す）
+    """
+    transaction_types = Counter(older["transaction_types"])
+    transaction_types.update(newer["transaction_types"])
+    
+    return {
+        "total_transactions": older["total_transactions"] + newer["total_transactions"],
+        "completed_transactions": older["completed_transactions"] + newer["completed_transactions"],
+        "undone_transactions": older["undone_transactions"] + newer["undone_transactions"],
+        "currency_pairs": list(set(older["currency_pairs"]).union(newer["currency_pairs"])),
+        "transaction_types": dict(transaction_types),
+        "date_range": {
+            "earliest": older["date_range"]["earliest"] or newer["date_range"]["earliest"],
+            "latest": newer["date_range"]["latest"] or older["date_range"]["latest"]
+        }
+    }
+
+class _LogSnapshot(NamedTuple):
+    """パース済みログと索引（ファイル内容ごとに作り直し、作成後は変更しない）"""
+    logs: List[Dict[str, Any]]
+    sorted_desc: List[Dict[str, Any]]
+    # sorted_desc と同じ並びの -ts_ns（昇順）。numpy があれば int64 配列
+    neg_ts_ns: Any
+    tombstones: int
+    by_id: Dict[str, Dict[str, Any]]
+    by_user: Dict[str, List[Dict[str, Any]]]
+    last_transaction: Optional[Dict[str, Any]]
+    last_undo: Optional[Dict[str, Any]]
+    stats: Dict[str, Any]
+
+_EMPTY_STATS = {
+    "total_transactions": 0,
+    "completed_transactions": 0,
+    "undone_transactions": 0,
+    "currency_pairs": [],
+    "transaction_types": {},
+    "date_range": {
+        "earliest": None,
+        "latest": None
+    }
+}
+
+_EMPTY_SNAPSHOT = _LogSnapshot([], [], [], 0, {}, {}, None, None, _EMPTY_STATS)
+
 class TransactionLog:
     """取引ログ管理クラス"""
     
     def __init__(self):
-        self._lock = threading.Lock()
+        # 派生ファイルのパスは毎回組み立てず、ここで一度だけ作っておく
+        self._backup_prefix = str(Config.TRANSACTION_LOG_FILE.with_name(f"{Config.TRANSACTION_LOG_FILE.stem}_backup_"))
+        # 既存のバックアップ（古い順）。書き込みのたびにディレクトリを走査しないよう手元で管理する
+        self._backups = self._load_backup_registry()
+        self._tmp_file = f"{Config.TRANSACTION_LOG_FILE}.tmp"
+        self._archive_prefix = str(Config.TRANSACTION_LOG_FILE.with_name("transactions_archive_"))
+        self._archive_glob = f"{self._archive_prefix}*.jsonl.gz"
+        self._archive_stats_file = f"{self._archive_prefix}stats.json"
+        self._archive_stats_tmp_file = f"{self._archive_stats_file}.tmp"
+        # 書き込み同士を排他にする（読み取りは不変のスナップショットを参照するためロック不要）
+        self._write_lock = threading.Lock()
+        # パース済みログと索引のキャッシュ（ファイルの (st_mtime_ns, st_size) が変わるまで再利用）
+        self._cache = None
+        self._cache_key = None
+        # 書き出し待ちのシリアライズ済み行（バックグラウンドでまとめて追記する）
+        self._pending = deque()
+        # ライブファイルの行数（墓標レコードを含む）。上限を超えたら古い半分をアーカイブへ移す
+        # 書き込み側だけが書き込みロック下で更新する
+        self._live_count = 0
         self._ensure_data_directory()
         self._ensure_log_file()
+        # アーカイブ済み取引の統計と、最後にアーカイブへ移した取引のID
+        self._archive_stats, self._last_archived_id = self._load_archive_stats()
+        with self._write_lock:
+            # 前回のアーカイブがライブファイルの書き直し前に中断していれば、ここで書き直しを終える
+            # （起動時に一度読み込んでキャッシュを温めるのも兼ねる）
+            self._finish_interrupted_archive(self._cached_snapshot().logs)
+            self._live_count = self._count_live_lines()
+        # 書き直した場合に備えてキャッシュを温め直す（変わっていなければそのまま使われる）
+        self._cached_snapshot()
+        self._flusher = DebouncedFlusher(self.flush, name="transaction-log-flusher")
+        atexit.register(self.flush)
     
     def add_transaction(self, transaction: Dict[str, Any]) -> str:
         """
@@ -32,30 +203,31 @@ class TransactionLog:
         Returns:
             追加された取引のID
         """
-        with self._lock:
-            try:
-                # 取引にIDとタイムスタンプを追加
-                transaction_id = str(uuid.uuid4())
-                transaction["id"] = transaction_id
-                
-                if "timestamp" not in transaction:
-                    transaction["timestamp"] = datetime.now().isoformat()
-                
-                # 既存のログを読み込み
-                logs = self._load_logs()
-                
-                # 新しい取引を追加
-                logs.append(transaction)
-                
-                # ログファイルに保存
-                self._save_logs(logs)
-                
-                logger.info(f"取引ログを追加しました: {transaction_id}")
-                return transaction_id
-                
-            except Exception as e:
-                logger.error(f"取引ログ追加中にエラー: {e}")
-                raise
+        try:
+            # ID・タイムスタンプの付与とシリアライズはロックの外で済ませる
+            transaction_id = str(uuid.uuid4())
+            transaction["id"] = transaction_id
+            
+            # timestamp は表示用に残し、比較には ts_ns を使う
+            if "timestamp" not in transaction:
+                ts_ns = time.time_ns()
+                transaction["timestamp"] = datetime.fromtimestamp(ts_ns / 1e9).isoformat()
+                transaction["ts_ns"] = ts_ns
+            else:
+                transaction["ts_ns"] = _iso_to_ns(transaction["timestamp"])
+            
+            payload = orjson.dumps(transaction, option=_DUMP_OPTS)
+            
+            # 追記はバックグラウンドでまとめて行う（読み取り時には先に書き出される）
+            self._pending.append(payload)
+            self._flusher.notify()
+            
+            logger.info(f"取引ログを追加しました: {transaction_id}")
+            return transaction_id
+            
+        except Exception as e:
+            logger.error(f"取引ログ追加中にエラー: {e}")
+            raise
     
     def get_logs(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """
@@ -68,15 +240,9 @@ class TransactionLog:
             取引ログのリスト（新しい順）
         """
         try:
-            logs = self._load_logs()
-            
-            # 新しい順にソート
-            logs.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
-            
-            if limit:
-                logs = logs[:limit]
-            
-            return logs
+            # 読み込み時にソート済みの新しい順リストを切り出す（スライスなのでキャッシュは変更されない）
+            sorted_desc = self._load_snapshot().sorted_desc
+            return sorted_desc[:limit] if limit else sorted_desc[:]
             
         except Exception as e:
             logger.error(f"取引ログ取得中にエラー: {e}")
@@ -87,17 +253,8 @@ class TransactionLog:
         最新の取引を取得
         """
         try:
-            logs = self._load_logs()
-            
-            if not logs:
-                return None
-            
-            # 最新の取引を取得（取り消し済みは除く）
-            for log in reversed(logs):
-                if log.get("type") == "取引" and log.get("status") != "取り消し済み":
-                    return log
-            
-            return None
+            # 最新の取引（取り消し済みは除く）は読み込み時に索引済み
+            return self._load_snapshot().last_transaction
             
         except Exception as e:
             logger.error(f"最新取引取得中にエラー: {e}")
@@ -108,17 +265,7 @@ class TransactionLog:
         最新の取り消し取引を取得
         """
         try:
-            logs = self._load_logs()
-            
-            if not logs:
-                return None
-            
-            # 最新の取り消し取引を取得
-            for log in reversed(logs):
-                if log.get("type") == "取り消し":
-                    return log
-            
-            return None
+            return self._load_snapshot().last_undo
             
         except Exception as e:
             logger.error(f"最新取り消し取引取得中にエラー: {e}")
@@ -129,13 +276,7 @@ class TransactionLog:
         IDで取引を取得
         """
         try:
-            logs = self._load_logs()
-            
-            for log in logs:
-                if log.get("id") == transaction_id:
-                    return log
-            
-            return None
+            return self._load_snapshot().by_id.get(transaction_id)
             
         except Exception as e:
             logger.error(f"取引ID検索中にエラー: {e}")
@@ -144,22 +285,27 @@ class TransactionLog:
     def mark_transaction_undone(self, transaction_id: str) -> bool:
         """
         取引を取り消し済みにマーク
+        対象はライブファイル内の取引のみ（アーカイブへ移した取引は取り消せず、Falseを返す）
         """
-        with self._lock:
+        with self._write_lock:
             try:
-                logs = self._load_logs()
+                self._flush_pending()
+                snapshot = self._cached_snapshot()
                 
-                for log in logs:
-                    if log.get("id") == transaction_id:
-                        log["status"] = "取り消し済み"
-                        log["undone_at"] = datetime.now().isoformat()
-                        break
-                else:
-                    logger.warning(f"取引ID {transaction_id} が見つかりません")
+                if transaction_id not in snapshot.by_id:
+                    logger.warning(f"取引ID {transaction_id} が見つかりません（アーカイブ済みの取引は取り消せません）")
                     return False
                 
-                self._save_logs(logs)
+                # 元の行は書き換えず、取り消しの墓標レコードを追記する
+                self._append_log({
+                    "op": "undo",
+                    "id": transaction_id,
+                    "undone_at": datetime.now().isoformat()
+                })
+                self._live_count += 1
                 logger.info(f"取引 {transaction_id} を取り消し済みにマークしました")
+                
+                self._compact_if_needed(len(snapshot.logs), snapshot.tombstones + 1)
                 return True
                 
             except Exception as e:
@@ -171,18 +317,9 @@ class TransactionLog:
         特定ユーザーの取引ログを取得
         """
         try:
-            all_logs = self._load_logs()
-            
-            # ユーザーIDでフィルター
-            user_logs = [log for log in all_logs if log.get("user_id") == user_id]
-            
-            # 新しい順にソート
-            user_logs.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
-            
-            if limit:
-                user_logs = user_logs[:limit]
-            
-            return user_logs
+            # ユーザー別の索引は新しい順に並んでいる
+            user_logs = self._load_snapshot().by_user.get(user_id, [])
+            return user_logs[:limit] if limit else user_logs[:]
             
         except Exception as e:
             logger.error(f"ユーザー取引ログ取得中にエラー: {e}")
@@ -193,51 +330,18 @@ class TransactionLog:
         取引統計を取得
         """
         try:
-            logs = self._load_logs()
-            
-            stats = {
-                "total_transactions": 0,
-                "completed_transactions": 0,
-                "undone_transactions": 0,
-                "currency_pairs": set(),
-                "transaction_types": {},
-                "date_range": {
-                    "earliest": None,
-                    "latest": None
-                }
-            }
-            
-            for log in logs:
-                stats["total_transactions"] += 1
-                
-                # ステータス別カウント
-                status = log.get("status", "")
-                if status == "完了":
-                    stats["completed_transactions"] += 1
-                elif status == "取り消し済み":
-                    stats["undone_transactions"] += 1
-                
-                # 通貨ペア集計
-                pair = log.get("currency_pair", "")
-                if pair and pair != "":
-                    stats["currency_pairs"].add(pair)
-                
-                # 取引タイプ集計
-                trans_type = log.get("type", "その他")
-                stats["transaction_types"][trans_type] = stats["transaction_types"].get(trans_type, 0) + 1
-                
-                # 日付範囲
-                timestamp = log.get("timestamp")
-                if timestamp:
-                    if stats["date_range"]["earliest"] is None or timestamp < stats["date_range"]["earliest"]:
-                        stats["date_range"]["earliest"] = timestamp
-                    if stats["date_range"]["latest"] is None or timestamp > stats["date_range"]["latest"]:
-                        stats["date_range"]["latest"] = timestamp
-            
-            # setをlistに変換
-            stats["currency_pairs"] = list(stats["currency_pairs"])
-            
-            return stats
+            # 集計はファイルが変わったときにスナップショットと一緒に済ませてある
+            stats = self._load_snapshot().stats
+            if self._archive_stats is not None:
+                return _merge_stats(self._archive_stats, stats)
+            
+            # キャッシュ側を書き換えられないよう入れ物はコピーして返す
+            return dict(
+                stats,
+                currency_pairs=list(stats["currency_pairs"]),
+                transaction_types=dict(stats["transaction_types"]),
+                date_range=dict(stats["date_range"])
+            )
             
         except Exception as e:
             logger.error(f"統計取得中にエラー: {e}")
@@ -255,21 +359,17 @@ class TransactionLog:
             取引リスト（新しい順）
         """
         try:
-            logs = self._load_logs()
+            snapshot = self._load_snapshot()
+            logs = snapshot.sorted_desc
             
             if not logs:
                 return []
             
-            # 時間範囲でフィルタリング（指定された場合）
+            # 時間範囲で絞り込み（新しい順に並んでいるので、範囲内は先頭からの連続区間）
             if hours is not None:
-                cutoff_time = datetime.now() - timedelta(hours=hours)
-                cutoff_iso = cutoff_time.isoformat()
-                
-                logs = [log for log in logs 
-                       if log.get("timestamp", "") >= cutoff_iso]
-            
-            # タイムスタンプで降順ソート（新しい順）
-            logs.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
+                cutoff_ns = time.time_ns() - hours * 3600 * 1_000_000_000
+                # ts_ns >= cutoff_ns  <=>  -ts_ns <= -cutoff_ns
+                limit = min(limit, _count_at_most(snapshot.neg_ts_ns, -cutoff_ns))
             
             # 指定件数まで取得
             return logs[:limit]
@@ -280,52 +380,335 @@ class TransactionLog:
 
     def _load_logs(self) -> List[Dict[str, Any]]:
         """
-        ログファイルからデータを読み込み
+        ログファイルからデータを読み込み（取り消しマークを反映済み、追加順）
+        ファイルが変更されていなければキャッシュ済みのリストを返す（呼び出し側で変更しないこと）
+        """
+        return self._load_snapshot().logs
+    
+    def _load_snapshot(self) -> _LogSnapshot:
+        """
+        書き出し待ちの取引を反映したうえで、パース済みログと索引を取得
+        """
+        if self._pending:
+            self.flush()
+        
+        return self._cached_snapshot()
+    
+    def _cached_snapshot(self) -> _LogSnapshot:
+        """
+        パース済みログと索引を取得（ファイルが変更されていなければキャッシュを返す）
         """
         try:
-            if not os.path.exists(Config.TRANSACTION_LOG_FILE):
-                return []
-            
-            with open(Config.TRANSACTION_LOG_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            st = os.stat(Config.TRANSACTION_LOG_FILE)
+        except FileNotFoundError:
+            return _EMPTY_SNAPSHOT
+        
+        key = (st.st_mtime_ns, st.st_size)
+        snapshot = self._cache
+        if key == self._cache_key and snapshot is not None:
+            return snapshot
+        
+        snapshot = self._build_snapshot(*self._read_log_file())
+        # 他スレッドが新しいキーと古い内容を組み合わせて見ないよう、内容を先に置く
+        self._cache = snapshot
+        self._cache_key = key
+        return snapshot
+    
+    def _build_snapshot(self, logs: List[Dict[str, Any]], tombstones: int) -> _LogSnapshot:
+        """
+        ID・ユーザー別の索引、新しい順のリスト、最新取引/最新取り消し、統計を作成
+        ソートと集計はファイルが変わったときのここ1回だけで、読み取り側では行わない
+        """
+        sorted_desc = sorted(logs, key=_ts_ns_key, reverse=True)
+        if np is not None:
+            neg_ts_ns = np.fromiter((-log["ts_ns"] for log in sorted_desc), dtype=np.int64, count=len(sorted_desc))
+        else:
+            neg_ts_ns = [-log["ts_ns"] for log in sorted_desc]
+        
+        by_user = defaultdict(list)
+        for log in sorted_desc:
+            user_id = log.get("user_id")
+            if user_id is not None:
+                by_user[user_id].append(log)
+        
+        by_id = {}
+        last_transaction = None
+        last_undo = None
+        
+        for log in logs:
+            transaction_id = log.get("id")
+            if transaction_id is not None:
+                by_id[transaction_id] = log
+            
+            trans_type = log.get("type")
+            if trans_type == "取引":
+                if log.get("status") != "取り消し済み":
+                    last_transaction = log
+            elif trans_type == "取り消し":
+                last_undo = log
+        
+        return _LogSnapshot(logs, sorted_desc, neg_ts_ns, tombstones, by_id, dict(by_user), last_transaction, last_undo, _compute_stats(logs))
+    
+    def _invalidate_cache(self):
+        """
+        パース済みログのキャッシュを破棄
+        """
+        self._cache_key = None
+        self._cache = None
+    
+    def _read_log_file(self) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        JSONLファイルを読み込み、墓標レコードを元の取引に畳み込む
+        
+        Returns:
+            (取引ログのリスト, 墓標レコード数)
+        """
+        try:
+            try:
+                lines = self._read_log_lines()
+            except FileNotFoundError:
+                return [], 0
+            
+            logs = []
+            undo_marks = []
+            for line_no, line in enumerate(lines, 1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = orjson.loads(line)
+                except orjson.JSONDecodeError as e:
+                    # 書き込み途中で落ちた末尾行などは読み飛ばす
+                    logger.error(f"取引ログ {line_no} 行目のJSON解析エラー: {e}")
+                    continue
+                if entry.get("op") == "undo":
+                    undo_marks.append(entry)
+                else:
+                    if "ts_ns" not in entry:
+                        # ts_ns 導入前の行はタイムスタンプから補う
+                        entry["ts_ns"] = _iso_to_ns(entry.get("timestamp"))
+                    logs.append(entry)
+            
+            if undo_marks:
+                by_id = {log["id"]: log for log in logs if "id" in log}
+                for mark in undo_marks:
+                    log = by_id.get(mark.get("id"))
+                    if log is not None:
+                        log["status"] = "取り消し済み"
+                        log["undone_at"] = mark.get("undone_at")
             
-            if isinstance(data, dict) and "transactions" in data:
-                return data["transactions"]
-            elif isinstance(data, list):
-                return data
-            else:
-                logger.warning("取引ログファイルの形式が無効です")
-                return []
+            return logs, len(undo_marks)
                 
-        except json.JSONDecodeError as e:
-            logger.error(f"取引ログファイルのJSON解析エラー: {e}")
-            return []
         except Exception as e:
             logger.error(f"取引ログ読み込み中にエラー: {e}")
-            return []
+            return [], 0
+    
+    def _read_log_lines(self) -> List[bytes]:
+        """
+        ログファイルの各行を読み込む
+        大きなファイルはmmapでページキャッシュから直接切り出し、ファイル全体のコピーを避ける
+        """
+        with open(Config.TRANSACTION_LOG_FILE, 'rb') as f:
+            if sys.platform == "win32" or os.fstat(f.fileno()).st_size < MMAP_MIN_SIZE:
+                return f.readlines()
+            
+            with mmap.mmap(f.fileno(), 0, prot=mmap.PROT_READ) as mm:
+                return list(iter(mm.readline, b""))
+    
+    def _count_live_lines(self) -> int:
+        """
+        ライブファイルの空でない行数を数える（墓標レコードや壊れた行も1行として数える）
+        """
+        try:
+            return sum(1 for line in self._read_log_lines() if line.strip())
+        except FileNotFoundError:
+            return 0
+    
+    def flush(self):
+        """
+        書き出し待ちの取引をログファイルに追記（終了時や書き込み直後に読みたい場合に使う）
+        """
+        with self._write_lock:
+            self._flush_pending()
+    
+    def _flush_pending(self):
+        """
+        書き出し待ちの行を1回の書き込みでまとめて追記（書き込みロック取得済みで呼ぶこと）
+        """
+        if not self._pending:
+            return
+        
+        # 書き終えるまで待ち行列から外さない（読み取り側は待ち行列が空なら書き出し済みとみなせる）
+        lines = list(self._pending)
+        self._append_line(b"".join(lines))
+        for _ in lines:
+            self._pending.popleft()
+        
+        self._live_count += len(lines)
+        if self._live_count > Config.MAX_LIVE_TRANSACTIONS:
+            self._archive_oldest()
+    
+    def _archive_oldest(self):
+        """
+        ライブファイルの古い半分を月別のgzipアーカイブへ移す（書き込みロック取得済みで呼ぶこと）
+        アーカイブ分の統計は別ファイルに積み上げ、アーカイブ本体は通常読み込まない
+        """
+        try:
+            logs, tombstones = self._read_log_file()
+            if self._finish_interrupted_archive(logs):
+                return
+            
+            if len(logs) <= Config.MAX_LIVE_TRANSACTIONS:
+                # 上限を超えた分は墓標レコードなので、アーカイブせずにコンパクションだけ行う
+                self._save_logs(logs)
+                logger.info(f"取引ログをコンパクションしました（墓標 {tombstones} 件）")
+                return
+            
+            split = len(logs) // 2
+            archived, live = logs[:split], logs[split:]
+            
+            by_month = defaultdict(list)
+            for log in archived:
+                month = log.get("timestamp", "")[:7].replace("-", "") or f"{datetime.now():%Y%m}"
+                by_month[month].append(orjson.dumps(log, option=_DUMP_OPTS))
+            
+            # アーカイブ → 統計（最後にアーカイブした取引のIDを含む）→ ライブファイルの順に書く
+            # 途中で落ちても取引は失われず、ライブファイルの書き直し前に落ちた場合は
+            # 次回 _finish_interrupted_archive が記録済みのIDまでを取り除くので、二重にアーカイブされない
+            for month, lines in by_month.items():
+                with gzip.open(f"{self._archive_prefix}{month}.jsonl.gz", 'ab') as f:
+                    f.write(b"".join(lines))
+            
+            archive_stats = _compute_stats(archived)
+            if self._archive_stats is not None:
+                archive_stats = _merge_stats(self._archive_stats, archive_stats)
+            last_archived_id = next((log["id"] for log in reversed(archived) if log.get("id")), None)
+            self._save_archive_stats(archive_stats, last_archived_id)
+            
+            self._save_logs(live)
+            logger.info(f"古い取引ログ {len(archived)} 件をアーカイブへ移しました")
+            
+        except Exception as e:
+            logger.error(f"取引ログのアーカイブ中にエラー: {e}")
+    
+    def _finish_interrupted_archive(self, logs: List[Dict[str, Any]]) -> bool:
+        """
+        最後にアーカイブした取引がまだライブファイルに残っていれば、そこまでを取り除いて書き直す
+        （書き込みロック取得済みで呼ぶこと）
+        
+        Returns:
+            書き直した場合True
+        """
+        last_archived_id = self._last_archived_id
+        if last_archived_id is None:
+            return False
+        
+        for index, log in enumerate(logs):
+            if log.get("id") == last_archived_id:
+                self._save_logs(logs[index + 1:])
+                logger.info(f"中断していたアーカイブを完了しました（アーカイブ済み {index + 1} 件をライブファイルから除去）")
+                return True
+        return False
+    
+    def _load_archive_stats(self) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        アーカイブ済み取引の統計と、最後にアーカイブした取引のIDを読み込み（アーカイブが無ければNone）
+        """
+        try:
+            with open(self._archive_stats_file, 'rb') as f:
+                stats = orjson.loads(f.read())
+            return stats, stats.pop("last_archived_id", None)
+        except FileNotFoundError:
+            return None, None
+        except Exception as e:
+            logger.error(f"アーカイブ統計の読み込み中にエラー: {e}")
+            return None, None
+    
+    def _save_archive_stats(self, stats: Dict[str, Any], last_archived_id: Optional[str]):
+        """
+        アーカイブ統計を一時ファイル + os.replace でアトミックに書き込む（書き込みロック取得済みで呼ぶこと）
+        """
+        with open(self._archive_stats_tmp_file, 'wb') as f:
+            f.write(orjson.dumps(dict(stats, last_archived_id=last_archived_id), option=_DUMP_OPTS))
+        os.replace(self._archive_stats_tmp_file, self._archive_stats_file)
+        self._archive_stats = stats
+        self._last_archived_id = last_archived_id
+    
+    def _load_archived_logs(self, start_date: Optional[str], end_date: Optional[str]) -> List[Dict[str, Any]]:
+        """
+        指定期間にかかる月のアーカイブだけを読み込み（古い順）
+        """
+        start_month = start_date[:7].replace("-", "") if start_date else ""
+        end_month = end_date[:7].replace("-", "") if end_date else ""
+        
+        logs = []
+        for path in sorted(glob.glob(self._archive_glob)):
+            month = path[len(self._archive_prefix):-len(".jsonl.gz")]
+            if (start_month and month < start_month) or (end_month and month > end_month):
+                continue
+            with gzip.open(path, 'rb') as f:
+                for line in f:
+                    if line.strip():
+                        logs.append(orjson.loads(line))
+        return logs
+    
+    def _append_log(self, entry: Dict[str, Any]):
+        """
+        ログファイルに1レコードを追記（既存部分は書き換えない）
+        """
+        self._append_line(orjson.dumps(entry, option=_DUMP_OPTS))
+    
+    def _append_line(self, payload: bytes):
+        """
+        シリアライズ済みの1行をログファイルに追記（書き込みロック取得済みで呼ぶこと）
+        """
+        with open(Config.TRANSACTION_LOG_FILE, 'ab') as f:
+            f.write(payload)
+        self._invalidate_cache()
     
     def _save_logs(self, logs: List[Dict[str, Any]]):
         """
-        ログファイルにデータを保存
+        ログファイル全体を書き直す（クリア・コンパクション・移行時のみ。書き込みロック取得済みか初期化中に呼ぶこと）
         """
         try:
             # バックアップを作成
             self._create_backup()
             
-            log_data = {
-                "transactions": logs,
-                "last_updated": datetime.now().isoformat(),
-                "version": "1.0",
-                "total_count": len(logs)
-            }
-            
-            with open(Config.TRANSACTION_LOG_FILE, 'w', encoding='utf-8') as f:
-                json.dump(log_data, f, indent=2, ensure_ascii=False)
+            with open(self._tmp_file, 'wb') as f:
+                for log in logs:
+                    f.write(orjson.dumps(log, option=_DUMP_OPTS))
+            os.replace(self._tmp_file, Config.TRANSACTION_LOG_FILE)
+            self._invalidate_cache()
+            self._live_count = len(logs)
             
         except Exception as e:
             logger.error(f"取引ログ保存中にエラー: {e}")
             raise
     
+    def compact(self) -> bool:
+        """
+        墓標レコードを元の取引に畳み込んでログファイルを詰め直す
+        """
+        with self._write_lock:
+            try:
+                self._flush_pending()
+                logs, tombstones = self._read_log_file()
+                if tombstones:
+                    self._save_logs(logs)
+                    logger.info(f"取引ログをコンパクションしました（墓標 {tombstones} 件）")
+                return True
+            except Exception as e:
+                logger.error(f"取引ログのコンパクション中にエラー: {e}")
+                return False
+    
+    def _compact_if_needed(self, total: int, tombstones: int):
+        """
+        墓標レコードの比率が閾値を超えていればコンパクション（ロック取得済みで呼ぶこと）
+        """
+        if total and tombstones / total > COMPACTION_THRESHOLD:
+            logs, _ = self._read_log_file()
+            self._save_logs(logs)
+            logger.info(f"取引ログをコンパクションしました（墓標 {tombstones} 件）")
+    
     def _ensure_data_directory(self):
         """
         データディレクトリの存在を確認・作成
@@ -334,51 +717,99 @@ class TransactionLog:
     
     def _ensure_log_file(self):
         """
-        ログファイルの存在を確認・作成
+        ログファイルの存在を確認・作成（旧形式のJSONがあればJSONLへ移行）
         """
-        if not os.path.exists(Config.TRANSACTION_LOG_FILE):
+        if os.path.exists(Config.TRANSACTION_LOG_FILE):
+            return
+        
+        legacy_logs = self._load_legacy_logs()
+        if legacy_logs:
+            self._save_logs(legacy_logs)
+            logger.info(f"旧形式の取引ログ {len(legacy_logs)} 件をJSONLへ移行しました: {_LEGACY_LOG_FILE}")
+        else:
             self._save_logs([])
             logger.info("取引ログファイルを作成しました")
     
-    def _create_backup(self):
+    def _load_legacy_logs(self) -> List[Dict[str, Any]]:
         """
-        現在のログファイルのバックアップを作成
+        旧形式（JSON全体書き込み）の取引ログを読み込み
         """
         try:
-            if os.path.exists(Config.TRANSACTION_LOG_FILE):
-                backup_file = Config.TRANSACTION_LOG_FILE.replace(
-                    '.json', 
-                    f'_backup_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json'
-                )
-                
-                with open(Config.TRANSACTION_LOG_FILE, 'r', encoding='utf-8') as src:
-                    with open(backup_file, 'w', encoding='utf-8') as dst:
-                        dst.write(src.read())
-                
-                # 古いバックアップファイルを削除
-                self._cleanup_old_backups()
+            try:
+                with open(_LEGACY_LOG_FILE, 'rb') as f:
+                    raw = f.read()
+            except FileNotFoundError:
+                return []
+            
+            data = orjson.loads(raw)
+            
+            if isinstance(data, dict) and "transactions" in data:
+                return data["transactions"]
+            elif isinstance(data, list):
+                return data
+            else:
+                logger.warning("旧形式の取引ログファイルの形式が無効です")
+                return []
                 
         except Exception as e:
-            logger.warning(f"ログバックアップ作成中にエラー: {e}")
+            logger.error(f"旧形式の取引ログ読み込み中にエラー: {e}")
+            return []
     
-    def _cleanup_old_backups(self, keep_count: int = 10):
+    def _create_backup(self):
         """
-        古いバックアップファイルを削除
+        現在のログファイルのバックアップを作成
         """
         try:
-            backup_pattern = Config.TRANSACTION_LOG_FILE.replace('.json', '_backup_*.json')
-            import glob
+            backup_file = f"{self._backup_prefix}{datetime.now():%Y%m%d_%H%M%S}.jsonl"
             
-            backup_files = glob.glob(backup_pattern)
-            if len(backup_files) <= keep_count:
+            # 全体の書き直しは os.replace で新しいファイルに切り替わるため、
+            # 直前の版はコピーせずハードリンクで残せば以後の追記の影響を受けない
+            try:
+                os.link(Config.TRANSACTION_LOG_FILE, backup_file)
+            except (FileNotFoundError, FileExistsError):
+                # ログファイルがまだ無い、または同じ秒のバックアップが既にある
                 return
+            except OSError:
+                # ハードリンク非対応のファイルシステムではコピーする
+                shutil.copy2(Config.TRANSACTION_LOG_FILE, backup_file)
             
-            # 作成日時でソートし、古いものから削除
-            backup_files.sort(key=os.path.getmtime)
-            files_to_delete = backup_files[:-keep_count]
+            self._backups.append(backup_file)
             
-            for file_path in files_to_delete:
-                os.remove(file_path)
+            # 古いバックアップファイルを削除
+            self._cleanup_old_backups()
+                
+        except Exception as e:
+            logger.warning(f"ログバックアップ作成中にエラー: {e}")
+    
+    def _load_backup_registry(self) -> deque:
+        """
+        起動時に一度だけディレクトリを走査し、既存のバックアップを古い順に並べる
+        """
+        directory, prefix = os.path.split(self._backup_prefix)
+        try:
+            with os.scandir(directory or ".") as it:
+                backups = [
+                    (entry.stat().st_mtime, entry.path)
+                    for entry in it
+                    if entry.name.startswith(prefix) and entry.name.endswith(".jsonl")
+                ]
+        except FileNotFoundError:
+            return deque()
+        
+        backups.sort()
+        return deque(path for _, path in backups)
+    
+    def _cleanup_old_backups(self, keep_count: int = 10):
+        """
+        古いバックアップファイルを削除（登録済みのバックアップを古い方から消す）
+        """
+        try:
+            while len(self._backups) > keep_count:
+                file_path = self._backups.popleft()
+                try:
+                    os.remove(file_path)
+                except FileNotFoundError:
+                    pass
                 logger.debug(f"古いログバックアップファイルを削除: {file_path}")
                 
         except Exception as e:
@@ -388,12 +819,10 @@ class TransactionLog:
         """
         全ての取引ログを削除
         """
-        with self._lock:
+        with self._write_lock:
             try:
-                # バックアップを作成
-                self._create_backup()
-                
-                # ログをクリア
+                # 書き出し待ちの取引もバックアップに含めてからクリア（_save_logs 内でバックアップを作成）
+                self._flush_pending()
                 self._save_logs([])
                 
                 logger.info("取引ログをクリアしました")
@@ -406,9 +835,15 @@ class TransactionLog:
     def export_logs(self, file_path: str, start_date: Optional[str] = None, end_date: Optional[str] = None) -> bool:
         """
         取引ログをファイルにエクスポート
+        指定期間がライブファイルより古い範囲にかかる場合だけアーカイブも読み込む
         """
         try:
-            logs = self._load_logs()
+            snapshot = self._load_snapshot()
+            logs = snapshot.logs
+            
+            live_earliest = snapshot.stats["date_range"]["earliest"]
+            if self._archive_stats is not None and (not start_date or not live_earliest or start_date < live_earliest):
+                logs = self._load_archived_logs(start_date, end_date) + logs
             
             # 日付でフィルター
             if start_date or end_date:
@@ -432,8 +867,9 @@ class TransactionLog:
                 "transactions": logs
             }
             
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(export_data, f, indent=2, ensure_ascii=False)
+            # エクスポートは人が読むためのものなので、ここだけ整形して出力する
+            with open(file_path, 'wb') as f:
+                f.write(orjson.dumps(export_data, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE))
             
             logger.info(f"取引ログを {file_path} にエクスポートしました")
             return True
@@ -16,9 +16,9 @@ project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
 from config import Config
-from services.inference_service import InferenceService
+from services import get_inference_service
 from models.balance_manager import BalanceManager
-from utils.slack_utils import SlackUtils
+from utils.slack_utils import get_slack_utils
 
 # ログ設定
 logging.basicConfig(
@@ -31,23 +31,96 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Slackが1メッセージで受け付けるブロック数の上限と、テキストオブジェクト1つあたりの文字数上限
+SLACK_MAX_BLOCKS = 50
+SLACK_MAX_TEXT_LENGTH = 3000
+# 市場分析・リスク評価の長文を分割するときの1セクションあたりの最大ブロック数
+SLACK_MAX_SECTION_BLOCKS = 10
+# Slack送信キューの最大長と送信レート（chat.postMessage の Tier 3 = 50回/分）
+SLACK_QUEUE_SIZE = 256
+SLACK_RATE_PER_MINUTE = 50
+# 停止時にキューに残った通知を送り切るまで待つ最大秒数
+SLACK_DRAIN_TIMEOUT = 30
+
+def _section_blocks(text, max_blocks=1):
+    """
+    テキストを上限文字数以内の section ブロックに分割する（なるべく改行位置で区切る）
+    max_blocks を超える分は最後のブロックの末尾を「…」にして切り詰める
+    """
+    blocks = []
+    while text:
+        if len(blocks) == max_blocks - 1 and len(text) > SLACK_MAX_TEXT_LENGTH:
+            chunk, text = text[:SLACK_MAX_TEXT_LENGTH - 1] + "…", ""
+        elif len(text) <= SLACK_MAX_TEXT_LENGTH:
+            chunk, text = text, ""
+        else:
+            cut = text.rfind("\n", 0, SLACK_MAX_TEXT_LENGTH)
+            if cut <= 0:
+                cut = SLACK_MAX_TEXT_LENGTH
+            chunk, text = text[:cut], text[cut:].lstrip("\n")
+        blocks.append({"type": "section", "text": {"type": "mrkdwn", "text": chunk}})
+    return blocks
+
 class SchedulerService:
     """定期実行スケジューラーサービス"""
     
     def __init__(self):
-        self.inference_service = InferenceService()
+        self.inference_service = get_inference_service()
         self.balance_manager = BalanceManager()
-        self.slack_utils = SlackUtils()
-        self.running = True
-        
-        # シグナルハンドラーの設定
-        signal.signal(signal.SIGTERM, self._signal_handler)
-        signal.signal(signal.SIGINT, self._signal_handler)
+        self.slack_utils = get_slack_utils()
+        # 停止要求（シグナル受信）で待機を即座に打ち切るためのイベント
+        self._stop_event = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        # Slack送信は専用ワーカーに任せ、推論処理は投入だけで戻る
+        self._slack_queue: asyncio.Queue = asyncio.Queue(maxsize=SLACK_QUEUE_SIZE)
+        # バックグラウンドタスクは参照を保持し、途中でGCされないようにする（停止時にまとめて終了）
+        self._bg_tasks: set = set()
+        self._spawn(self._slack_worker())
     
-    def _signal_handler(self, signum, frame):
-        """シグナルハンドラー"""
+    def _spawn(self, coro) -> asyncio.Task:
+        """バックグラウンドタスクを起動し、完了するまで参照を保持"""
+        task = asyncio.create_task(coro)
+        self._bg_tasks.add(task)
+        task.add_done_callback(self._bg_tasks.discard)
+        return task
+    
+    def _signal_handler(self, signum):
+        """シグナルハンドラー（イベントループ上で呼ばれる）"""
         logger.info(f"シグナル {signum} を受信しました。停止処理を開始します...")
-        self.running = False
+        self._stop_event.set()
+    
+    async def _wait_for_stop(self, timeout):
+        """停止要求が来るか timeout 秒経過するまで待機"""
+        try:
+            await asyncio.wait_for(self._stop_event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+    
+    async def _slack_worker(self):
+        """キューに積まれたSlackメッセージをトークンバケットで間隔を空けながら送信"""
+        rate = SLACK_RATE_PER_MINUTE / 60
+        tokens = float(SLACK_RATE_PER_MINUTE)
+        last = self._loop.time()
+        while True:
+            message = await self._slack_queue.get()
+            try:
+                now = self._loop.time()
+                tokens = min(float(SLACK_RATE_PER_MINUTE), tokens + (now - last) * rate)
+                last = now
+                if tokens < 1:
+                    await asyncio.sleep((1 - tokens) / rate)
+                    tokens = 1.0
+                    last = self._loop.time()
+                tokens -= 1
+                await self.slack_utils.send_message(**message)
+            except Exception as e:
+                logger.error(f"Slack送信ワーカーでエラー: {e}")
+            finally:
+                self._slack_queue.task_done()
+    
+    async def _enqueue_message(self, channel, text, **kwargs):
+        """Slackメッセージを送信キューに積む（送信完了は待たない）"""
+        await self._slack_queue.put({"channel_id": channel, "text": text, **kwargs})
     
     async def run_periodic_inference(self):
         """定期推論を実行（設定により実データまたはシミュレーション）"""
@@ -87,52 +160,79 @@ class SchedulerService:
             data_type = "実データ" if use_real_data else "シミュレーション"
             data_source = result.get("data_source", "simulation")
             
-            # 基本メッセージ
-            message = f"🤖 **定期推論結果**（{data_type}使用）\n"
-            message += f"📋 データソース: {data_source}\n\n"
-            message += f"📊 **市場分析**\n{result.get('market_analysis', 'N/A')}\n\n"
+            # セクションごとに組み立て、1回の chat.postMessage で Block Kit として送る
+            head = [
+                f"🤖 **定期推論結果**（{data_type}使用）\n📋 データソース: {data_source}",
+                f"📊 **市場分析**\n{result.get('market_analysis', 'N/A')}",
+            ]
             
-            # 推奨取引
+            # 推奨取引（1件ごとに1セクション）
             recommended_trades = result.get('recommended_trades', [])
             if recommended_trades:
-                message += "💡 **推奨取引**\n"
-                for trade in recommended_trades:
-                    action_emoji = "📈" if trade['action'] == 'buy' else "📉"
-                    confidence = trade.get('confidence', 0) * 100
-                    message += f"{action_emoji} {trade['pair']}: {trade['action']} "
-                    message += f"({confidence:.0f}%信頼度)\n"
-                    if trade.get('reasoning'):
-                        message += f"   理由: {trade['reasoning']}\n"
-                message += "\n"
+                head.append("💡 **推奨取引**")
+                trades = [self._format_trade(trade) for trade in recommended_trades]
             else:
-                message += "💡 **推奨取引**: 現時点では新しい取引を推奨しません\n\n"
+                head.append("💡 **推奨取引**: 現時点では新しい取引を推奨しません")
+                trades = []
             
             # リスク評価
-            message += f"⚠️ **リスク評価**\n{result.get('risk_assessment', 'N/A')}\n\n"
+            tail = [f"⚠️ **リスク評価**\n{result.get('risk_assessment', 'N/A')}"]
             
             # 実データ特有の情報
             if use_real_data and result.get('trades_performed'):
-                message += f"📊 **実行済み取引数**: {len(result['trades_performed'])}件\n\n"
+                tail.append(f"📊 **実行済み取引数**: {len(result['trades_performed'])}件")
             
             # 全体的な信頼度
             confidence = result.get("confidence_score", 0) * 100
-            message += f"🎯 **推論信頼度**: {confidence:.0f}%\n"
-            message += f"🕐 **実行時刻**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+            tail.append(
+                f"🎯 **推論信頼度**: {confidence:.0f}%\n"
+                f"🕐 **実行時刻**: {datetime.now():%Y-%m-%d %H:%M:%S}"
+            )
             
-            await self.slack_utils.send_message(channel, message)
+            head_blocks = [block for section in head for block in _section_blocks(section, SLACK_MAX_SECTION_BLOCKS)]
+            tail_blocks = [block for section in tail for block in _section_blocks(section, SLACK_MAX_SECTION_BLOCKS)]
+            
+            # ブロック数の上限に収まらない推奨取引は末尾を「…他N件」にまとめ、リスク評価とフッターは必ず残す
+            room = SLACK_MAX_BLOCKS - len(head_blocks) - len(tail_blocks)
+            if len(trades) > room:
+                shown = max(room - 1, 0)
+                trade_blocks = [block for trade in trades[:shown] for block in _section_blocks(trade)]
+                trade_blocks += _section_blocks(f"…他{len(trades) - shown}件")
+            else:
+                trade_blocks = [block for trade in trades for block in _section_blocks(trade)]
+            
+            blocks = head_blocks + trade_blocks + tail_blocks
+            # 通知やBlock Kit非対応クライアント向けのフォールバックテキスト
+            message = "\n\n".join(head + trades + tail)
+            
+            await self._enqueue_message(channel, message, blocks=blocks)
             
         except Exception as e:
             logger.error(f"Slack通知送信エラー: {e}")
     
+    @staticmethod
+    def _format_trade(trade) -> str:
+        """推奨取引1件分のテキストを作成"""
+        action = trade['action']
+        reasoning = trade.get('reasoning')
+        action_emoji = "📈" if action == 'buy' else "📉"
+        confidence = trade.get('confidence', 0) * 100
+        parts = [f"{action_emoji} {trade['pair']}: {action} ({confidence:.0f}%信頼度)"]
+        if reasoning:
+            parts.append(f"\n   理由: {reasoning}")
+        return "".join(parts)
+    
     async def _send_error_notification(self, error_message):
         """エラー通知をSlackに送信"""
         try:
             channel = Config.ADMIN_CHANNEL
-            message = f"❌ **定期推論エラー**\n\n"
-            message += f"エラー内容: {error_message}\n"
-            message += f"発生時刻: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+            message = "".join([
+                "❌ **定期推論エラー**\n\n",
+                f"エラー内容: {error_message}\n",
+                f"発生時刻: {datetime.now():%Y-%m-%d %H:%M:%S}",
+            ])
             
-            await self.slack_utils.send_message(channel, message)
+            await self._enqueue_message(channel, message)
             
         except Exception as e:
             logger.error(f"エラー通知送信エラー: {e}")
@@ -141,25 +241,38 @@ class SchedulerService:
         """スケジューラーサービスを開始"""
         logger.info("定期実行スケジューラーを開始します...")
         
-        interval_seconds = Config.PERIODIC_INFERENCE_INTERVAL_HOURS * 3600
-        logger.info(f"実行間隔: {Config.PERIODIC_INFERENCE_INTERVAL_HOURS}時間")
+        # シグナルハンドラーの設定（イベントループ経由で受け取り、待機中でもすぐに起こす）
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            self._loop.add_signal_handler(sig, self._signal_handler, sig)
         
-        while self.running:
+        # 設定値はループの外で一度だけ読む
+        interval_hours = Config.PERIODIC_INFERENCE_INTERVAL_HOURS
+        interval_seconds = interval_hours * 3600
+        logger.info(f"実行間隔: {interval_hours}時間")
+        
+        while not self._stop_event.is_set():
             try:
                 # 定期推論を実行
                 await self.run_periodic_inference()
                 
                 # 次回実行まで待機
-                logger.info(f"次回実行まで{Config.PERIODIC_INFERENCE_INTERVAL_HOURS}時間待機します...")
-                for _ in range(interval_seconds):
-                    if not self.running:
-                        break
-                    await asyncio.sleep(1)
+                logger.info(f"次回実行まで{interval_hours}時間待機します...")
+                await self._wait_for_stop(interval_seconds)
                 
             except Exception as e:
                 logger.error(f"スケジューラーループでエラー: {e}")
                 # エラーが発生した場合、5分後にリトライ
-                await asyncio.sleep(300)
+                await self._wait_for_stop(300)
+        
+        # キューに残った通知を送り切ってからバックグラウンドタスクを止める
+        try:
+            await asyncio.wait_for(self._slack_queue.join(), timeout=SLACK_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"未送信のSlack通知が{self._slack_queue.qsize()}件残っています")
+        tasks = list(self._bg_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
         
         logger.info("定期実行スケジューラーを停止しました")
 
@@ -179,4 +292,10 @@ async def main():
         logger.error(f"予期しないエラー: {e}")
 
 if __name__ == "__main__":
+    # uvloopが利用可能ならlibuvベースのイベントループを使用（Windows等では標準asyncio）
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
     asyncio.run(main())
@@ -3,226 +3,231 @@
 """
 
 import asyncio
+import io
 import logging
-import tempfile
 from datetime import datetime
 from typing import Optional
 
-from services.inference_service import InferenceService
-from services.trading_service import TradingService
-from services.rate_service import RateService
-from utils.slack_utils import SlackUtils
+from services import get_inference_service, get_trading_service, get_rate_service
+from utils.slack_utils import get_slack_utils
 from config import Config
 
 logger = logging.getLogger(__name__)
 
+# 定期推論レポートの定型部分
+_REPORT_HEADER = "\n".join(("=" * 60, "🤖 実取引データ定期推論レポート", "=" * 60))
+_REPORT_DISCLAIMER = "\n".join((
+    "=" * 60,
+    "⚠️  重要な注意事項",
+    "=" * 60,
+    "• この推論結果は実際の取引データに基づく自動分析です",
+    "• 投資助言ではありません",
+    "• 為替取引にはリスクが伴います",
+    "• 取引の判断は自己責任で行ってください",
+))
+# (結果キー, 見出し) の順に本文セクションを出力
+_REPORT_SECTIONS = (
+    ("market_analysis", "📈 市場分析:"),
+    ("risk_assessment", "⚠️ リスク評価:"),
+    ("real_data_summary", "🔍 実取引データ分析サマリー:"),
+)
+
 class PeriodicInference:
     """実取引データ専用定期推論実行クラス"""
     
     def __init__(self):
-        self.inference_service = InferenceService()
-        self.trading_service = TradingService()
-        self.rate_service = RateService()
-        self.slack_utils = SlackUtils()
+        # 手動推論と同じインスタンスを共有し、実行権の排他もプロセス全体で効かせる
+        self.inference_service = get_inference_service()
+        self.trading_service = get_trading_service()
+        self.rate_service = get_rate_service()
+        self.slack_utils = get_slack_utils()
         
-    def run_periodic_inference(self):
+    async def run_periodic_inference(self):
         """
         定期推論を実行（実取引データのみ使用）
         手動推論とバッティングしないようにロック機構を使用
+        AsyncIOSchedulerからBoltと同じイベントループ上で直接awaitされる
         """
         try:
             logger.info("定期推論を開始します（実取引データ使用）")
             
-            # 推論が既に実行中かチェック
-            if self.inference_service.is_inference_running():
+            # 推論の実行権を取得（確認と取得を一度に行い、既に実行中ならスキップ）
+            if not await self.inference_service.try_acquire_inference():
                 logger.info("推論が既に実行中のため、定期推論をスキップします")
                 return
             
-            # 非同期で推論を実行
-            asyncio.run(self._run_periodic_inference_async())
+            try:
+                await self._run_periodic_inference_async()
+            finally:
+                # 取得した実行権は例外時も含め必ず解放
+                self.inference_service.reset_inference_state()
             
         except Exception as e:
             logger.error(f"定期推論実行中にエラー: {e}")
             # エラーが発生した場合、管理チャンネルに通知
-            asyncio.run(self._send_error_notification(e))
+            await self._send_error_notification(e)
     
     async def _run_periodic_inference_async(self):
         """
         非同期での定期推論実行（実取引データ専用）
         """
         try:
-            # 現在の残高を取得
-            current_balance = self.trading_service.get_current_balance()
+            # 現在の残高を取得（ファイル読み込みを伴うのでワーカースレッドで行う）
+            current_balance = await asyncio.to_thread(self.trading_service.get_current_balance)
             
             # レート取得時刻を記録
             rate_fetch_time = datetime.now()
             
             # 実取引データ推論を実行
-            inference_result = await self.inference_service.run_inference(current_balance)
+            inference_result = await self.inference_service.run_inference(current_balance, acquired=True)
             
             # 結果をフォーマット
+            # レポートの実行日時とファイル名で同じ時刻を使う
+            now = datetime.now()
             result_text = self._format_periodic_inference_result(
                 inference_result, 
-                rate_fetch_time
+                rate_fetch_time,
+                now=now
             )
             
-            # 結果をテキストファイルとして保存
-            temp_file_path = await self._save_result_to_temp_file(result_text)
+            # 一時ファイルを作らずメモリ上から送信する
+            report = io.BytesIO(result_text.encode("utf-8"))
+            # エンコード済みなので、Slack送信を待つ前に文字列は解放する
+            del result_text
+            
+            filename = f"periodic_inference_real_data_{now:%Y%m%d_%H%M%S}.txt"
             
-            filename = f"periodic_inference_real_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+            comment = "🤖 **定期推論結果**（実取引データ使用）\n\n自動推論が完了しました。結果をご確認ください。"
+            # 推奨取引がある場合は同じアップロードのコメントに含め、Slack APIの呼び出しを1回にする
+            if inference_result.get("recommended_trades"):
+                comment = "".join((
+                    comment,
+                    "\n\n",
+                    self._format_trade_recommendations(inference_result["recommended_trades"]),
+                ))
             
             # デフォルトチャンネルに結果を送信
             await self.slack_utils.send_message_with_file(
                 channel_id=Config.DEFAULT_CHANNEL,
-                text="🤖 **定期推論結果**（実取引データ使用）\n\n自動推論が完了しました。結果をご確認ください。",
-                file_path=temp_file_path,
+                text=comment,
+                file_obj=report,
                 filename=filename
             )
             
-            # 推奨取引がある場合は別途通知
-            if inference_result.get("recommended_trades"):
-                await self._send_trade_recommendations(inference_result["recommended_trades"])
-            
             logger.info("実取引データ定期推論が正常に完了しました")
             
         except Exception as e:
             logger.error(f"定期推論実行中にエラー: {e}")
             await self._send_error_notification(e)
-        finally:
-            # 推論状態をリセット
-            self.inference_service.reset_inference_state()
     
-    def _format_periodic_inference_result(self, result: dict, rate_fetch_time: datetime) -> str:
+    def _format_periodic_inference_result(self, result: dict, rate_fetch_time: datetime,
+                                          now: Optional[datetime] = None) -> str:
         """
         定期推論結果をフォーマット（実取引データ専用）
+        now: 推論実行日時として表示する時刻（省略時は現在時刻）
         """
-        formatted_text = []
-        
+        if now is None:
+            now = datetime.now()
         data_source = result.get("data_source", "real_trading_data")
         
-        formatted_text.append("=" * 60)
-        formatted_text.append("🤖 実取引データ定期推論レポート")
-        formatted_text.append("=" * 60)
-        formatted_text.append(f"推論実行日時: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        formatted_text.append(f"レート取得日時: {rate_fetch_time.strftime('%Y-%m-%d %H:%M:%S')}")
-        formatted_text.append(f"データソース: {data_source}")
-        formatted_text.append("")
+        formatted_text = [
+            _REPORT_HEADER,
+            f"推論実行日時: {now:%Y-%m-%d %H:%M:%S}",
+            f"レート取得日時: {rate_fetch_time:%Y-%m-%d %H:%M:%S}",
+            f"データソース: {data_source}",
+            "",
+        ]
         
         # 市場データの表示
-        if result.get("market_data"):
+        market_data = result.get("market_data")
+        if market_data:
             formatted_text.append("📊 現在の市場状況:")
-            market_data = result["market_data"]
-            
-            if market_data.get("rates"):
-                for pair, rate in market_data["rates"].items():
-                    trend = market_data.get("trends", {}).get(pair, "不明")
-                    formatted_text.append(f"  {pair}: {rate:.2f} (トレンド: {trend})")
+            market_rates = market_data.get("rates")
+            if market_rates:
+                trends = market_data.get("trends") or {}
+                formatted_text.extend(
+                    f"  {pair}: {rate:.2f} (トレンド: {trends.get(pair, '不明')})"
+                    for pair, rate in market_rates.items()
+                )
             formatted_text.append("")
         
         # 推奨取引がある場合
-        if result.get("recommended_trades"):
+        recommended_trades = result.get("recommended_trades")
+        if recommended_trades:
             formatted_text.append("💡 AI推奨取引（実取引データ分析）:")
-            for i, trade in enumerate(result["recommended_trades"], 1):
-                action = "🟢 買い推奨" if trade.get("action") == "buy" else "🔴 売り推奨"
-                confidence = trade.get("confidence", 0) * 100
-                formatted_text.append(f"{i}. {trade.get('pair')}: {action}")
-                formatted_text.append(f"   推奨金額: {trade.get('amount', 0):.2f}")
-                formatted_text.append(f"   目標レート: {trade.get('rate', 0):.2f}")
-                formatted_text.append(f"   信頼度: {confidence:.0f}%")
-                if trade.get("reasoning"):
-                    formatted_text.append(f"   理由: {trade.get('reasoning')}")
+            for i, trade in enumerate(recommended_trades, 1):
+                # 各項目は1回ずつ取り出してローカルで使う
+                get = trade.get
+                reasoning = get("reasoning")
+                action = "🟢 買い推奨" if get("action") == "buy" else "🔴 売り推奨"
+                confidence = get("confidence", 0) * 100
+                formatted_text.extend((
+                    f"{i}. {get('pair')}: {action}",
+                    f"   推奨金額: {get('amount', 0):.2f}",
+                    f"   目標レート: {get('rate', 0):.2f}",
+                    f"   信頼度: {confidence:.0f}%",
+                ))
+                if reasoning:
+                    formatted_text.append(f"   理由: {reasoning}")
                 formatted_text.append("")
         else:
-            formatted_text.append("💡 推奨取引: 現時点では新しい取引を推奨しません")
-            formatted_text.append("")
+            formatted_text.extend(("💡 推奨取引: 現時点では新しい取引を推奨しません", ""))
         
         # 現在の残高情報
-        if result.get("current_balance"):
+        current_balance = result.get("current_balance")
+        if current_balance:
             formatted_text.append("💰 現在のポートフォリオ:")
+            # 換算レートはループの前に一度だけ取り出す
+            rates = (market_data or {}).get("rates") or {}
+            usdjpy = rates.get("USDJPY", 150)
+            eurjpy = rates.get("EURJPY", 160)
             total_jpy = 0
-            for currency, amount in result["current_balance"].items():
+            for currency, amount in current_balance.items():
                 formatted_text.append(f"  {currency}: {amount:,.2f}")
                 # JPY換算（概算）
                 if currency == "JPY":
                     total_jpy += amount
                 elif currency == "USD":
-                    total_jpy += amount * result.get("market_data", {}).get("rates", {}).get("USDJPY", 150)
+                    total_jpy += amount * usdjpy
                 elif currency == "EUR":
-                    total_jpy += amount * result.get("market_data", {}).get("rates", {}).get("EURJPY", 160)
+                    total_jpy += amount * eurjpy
             
-            formatted_text.append(f"  総価値（概算）: ¥{total_jpy:,.2f}")
-            formatted_text.append("")
+            formatted_text.extend((f"  総価値（概算）: ¥{total_jpy:,.2f}", ""))
         
-        # 市場分析
-        if result.get("market_analysis"):
-            formatted_text.append("📈 市場分析:")
-            formatted_text.append(result["market_analysis"])
-            formatted_text.append("")
-        
-        # リスク評価
-        if result.get("risk_assessment"):
-            formatted_text.append("⚠️ リスク評価:")
-            formatted_text.append(result["risk_assessment"])
-            formatted_text.append("")
-        
-        # 実取引データ特有の情報
-        if result.get("real_data_summary"):
-            formatted_text.append("🔍 実取引データ分析サマリー:")
-            formatted_text.append(result["real_data_summary"])
-            formatted_text.append("")
+        # 市場分析・リスク評価・実取引データ特有の情報
+        for key, title in _REPORT_SECTIONS:
+            value = result.get(key)
+            if value:
+                formatted_text.extend((title, value, ""))
         
         # 免責事項
-        formatted_text.append("=" * 60)
-        formatted_text.append("⚠️  重要な注意事項")
-        formatted_text.append("=" * 60)
-        formatted_text.append("• この推論結果は実際の取引データに基づく自動分析です")
-        formatted_text.append("• 投資助言ではありません")
-        formatted_text.append("• 為替取引にはリスクが伴います")
-        formatted_text.append("• 取引の判断は自己責任で行ってください")
-        
-        return "\\n".join(formatted_text)
-    
-    async def _save_result_to_temp_file(self, text: str) -> str:
-        """
-        結果を一時ファイルに保存
-        """
-        loop = asyncio.get_event_loop()
+        formatted_text.append(_REPORT_DISCLAIMER)
         
-        def write_file():
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False, encoding='utf-8') as f:
-                f.write(text)
-                return f.name
-        
-        return await loop.run_in_executor(None, write_file)
+        return "\n".join(formatted_text)
     
-    async def _send_trade_recommendations(self, recommendations: list):
+    def _format_trade_recommendations(self, recommendations: list) -> str:
         """
-        推奨取引の個別通知
+        推奨取引アラートのテキストを作成（定期推論結果のコメントに添える）
         """
-        if not recommendations:
-            return
-        
         message_lines = ["🚨 **取引推奨アラート**（実取引データ分析）", ""]
         
         for i, trade in enumerate(recommendations, 1):
-            action_emoji = "🟢" if trade.get("action") == "buy" else "🔴"
-            action_text = "買い" if trade.get("action") == "buy" else "売り"
-            confidence = trade.get("confidence", 0) * 100
+            get = trade.get
+            reasoning = get("reasoning")
+            action_emoji, action_text = ("🟢", "買い") if get("action") == "buy" else ("🔴", "売り")
+            confidence = get("confidence", 0) * 100
             
-            message_lines.append(f"{action_emoji} **{trade.get('pair')}**: {action_text}推奨")
-            message_lines.append(f"   金額: {trade.get('amount', 0):.2f}")
-            message_lines.append(f"   レート: {trade.get('rate', 0):.2f}")
+            message_lines.append(f"{action_emoji} **{get('pair')}**: {action_text}推奨")
+            message_lines.append(f"   金額: {get('amount', 0):.2f}")
+            message_lines.append(f"   レート: {get('rate', 0):.2f}")
             message_lines.append(f"   信頼度: {confidence:.0f}%")
-            if trade.get("reasoning"):
-                message_lines.append(f"   理由: {trade.get('reasoning')}")
+            if reasoning:
+                message_lines.append(f"   理由: {reasoning}")
             message_lines.append("")
         
         message_lines.append("⚠️ 投資判断は慎重に行ってください")
         
-        await self.slack_utils.send_message(
-            channel_id=Config.DEFAULT_CHANNEL,
-            text="\\n".join(message_lines)
-        )
+        return "\n".join(message_lines)
     
     async def _send_error_notification(self, error: Exception):
         """
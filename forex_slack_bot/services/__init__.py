@@ -2,12 +2,24 @@
 ビジネスロジックサービス
 """
 
+from functools import lru_cache
+
 from .inference_service import InferenceService
-from .trading_service import TradingService
-from .rate_service import RateService
+from .trading_service import TradingService, get_trading_service
+from .rate_service import RateService, get_rate_service
+
+
+@lru_cache(maxsize=1)
+def get_inference_service() -> InferenceService:
+    """プロセス共有のInferenceServiceを取得"""
+    return InferenceService()
+
 
 __all__ = [
     "InferenceService",
     "TradingService",
-    "RateService"
+    "RateService",
+    "get_inference_service",
+    "get_trading_service",
+    "get_rate_service"
 ]
\ No newline at end of file
@@ -4,46 +4,90 @@
 
 import asyncio
 import logging
-import threading
 import os
+import re
 import sys
 from datetime import datetime
 from typing import Dict, Optional, Any
 import datetime as dt
 
 from config import Config
-from services.rate_service import RateService
+from services.rate_service import get_rate_service
+from services.trading_service import get_trading_service
 
 logger = logging.getLogger(__name__)
 
+# 分析テキストから推奨取引の行を拾う正規表現
+# 「推奨/推薦」を含む行のうち、USDJPY（無ければEURJPY）と買い（無ければ売り）が読み取れるものに一致する
+_REC_RE = re.compile(
+    r'^(?=.*(?:推奨|推薦))'
+    r'(?:(?=.*(?P<usd>USDJPY))|(?=.*EURJPY))'
+    r'(?:(?=.*(?P<buy>買|BUY))|(?=.*(?:売|SELL)))'
+    r'.*$',
+    re.MULTILINE,
+)
+
+
+def _notify_inference_error(message: str) -> None:
+    """
+    推論の失敗をシミュレータ側のSlackクライアントで通知（同期I/Oのためワーカースレッドで実行）
+    """
+    try:
+        from llm_forex_slack_simulator.slack_client import SlackBotClient
+        slack_client = SlackBotClient(slack_bot_path="../forex_slack_bot")
+        slack_client.send_inference_results({"error": message})
+    except Exception as e:
+        logger.error(f"[inference_service] Slack通知失敗: {e}")
+
+
+# llm_forex_slack_simulator の配置場所（リポジトリ内に無ければ共有ストレージ側を使う）
+_SIMULATOR_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'llm_forex_slack_simulator')
+_SIMULATOR_FALLBACK_PATH = '/mnt/bigdata/00_students/mattsun_ucl/workspace/forex/llm_forex_slack_simulator'
+_SIMULATOR_CONFIG_PATH = '/mnt/bigdata/00_students/mattsun_ucl/workspace/forex/llm_forex_slack_simulator/config/config.json'
+
 class InferenceService:
     """実取引データ専用推論実行サービス"""
     
+    # 読み込み済みの SlackForexSimulator（プロセス内で1つを使い回す）
+    _simulator = None
+    
     def __init__(self):
-        self.rate_service = RateService()
-        self._inference_lock = threading.Lock()
-        self._inference_running = False
+        self.rate_service = get_rate_service()
+        self.trading_service = get_trading_service()
+        # 推論の実行権。手動推論と定期推論はどちらもBoltのイベントループ上で動くので asyncio.Lock で排他にする
+        self._inference_lock = asyncio.Lock()
         
     def is_inference_running(self) -> bool:
         """
         推論が実行中かどうかを確認
         """
-        with self._inference_lock:
-            return self._inference_running
+        return self._inference_lock.locked()
+    
+    async def try_acquire_inference(self) -> bool:
+        """
+        推論の実行権を取得（待たずに取得を試みる）
+        既に実行中の場合はFalseを返す
+        """
+        if self._inference_lock.locked():
+            return False
+        # 空いているロックの acquire は待たずに完了するので、確認から取得までの間に他のタスクは割り込まない
+        await self._inference_lock.acquire()
+        return True
     
     def reset_inference_state(self):
         """
-        推論状態をリセット
+        推論状態をリセット（取得済みの実行権を解放）
         """
-        with self._inference_lock:
-            self._inference_running = False
+        if self._inference_lock.locked():
+            self._inference_lock.release()
     
-    async def run_inference(self, current_balance: Dict[str, float]) -> Dict[str, Any]:
+    async def run_inference(self, current_balance: Dict[str, float], acquired: bool = False) -> Dict[str, Any]:
         """
         実際の取引データを使用した推論を実行
         
         Args:
             current_balance: 現在の残高情報
+            acquired: 呼び出し側で try_acquire_inference 済みの場合True（実行権の解放も呼び出し側が行う）
             
         Returns:
             推論結果（推奨取引、市場分析、リスク評価など）
@@ -52,25 +96,20 @@ class InferenceService:
             Exception: 推論実行中にエラーが発生した場合
         """
         # 推論状態を設定
-        with self._inference_lock:
-            if self._inference_running:
-                raise RuntimeError("推論が既に実行中です")
-            self._inference_running = True
+        if not acquired and not await self.try_acquire_inference():
+            raise RuntimeError("推論が既に実行中です")
         
         try:
             logger.info("[inference_service] 実取引データ推論を開始します")
-            print("[inference_service] run_inference: 市場データ取得前")
             # 現在の市場データを取得
             market_data = await self._fetch_market_data()
-            print("[inference_service] run_inference: _execute_real_data_inference呼び出し直前")
-            logger.info("[inference_service] _execute_real_data_inference呼び出し直前")
+            logger.debug("[inference_service] run_inference: _execute_real_data_inference呼び出し直前")
             # 実際の取引データを使用した推論を実行
             inference_result = await self._execute_real_data_inference(
                 current_balance=current_balance,
                 market_data=market_data
             )
-            print("[inference_service] run_inference: _execute_real_data_inference呼び出し直後")
-            logger.info("[inference_service] _execute_real_data_inference呼び出し直後")
+            logger.debug("[inference_service] run_inference: _execute_real_data_inference呼び出し直後")
             # 結果を整形
             formatted_result = self._format_inference_result(
                 inference_result, 
@@ -78,22 +117,16 @@ class InferenceService:
                 market_data
             )
             logger.info("[inference_service] 実取引データ推論が正常に完了しました")
-            print("[inference_service] run_inference: 完了")
             return formatted_result
         except Exception as e:
             logger.error(f"[inference_service] 実取引データ推論実行中にエラーが発生: {e}")
-            print(f"[inference_service] run_inference: 例外発生: {e}")
             # Slack通知（失敗時）
-            try:
-                from llm_forex_slack_simulator.slack_client import SlackBotClient
-                slack_client = SlackBotClient(slack_bot_path="../forex_slack_bot")
-                slack_client.send_inference_results({"error": f"inference_service.run_inference例外: {e}"})
-            except Exception as ee:
-                logger.error(f"[inference_service] Slack通知失敗: {ee}")
+            await asyncio.to_thread(_notify_inference_error, f"inference_service.run_inference例外: {e}")
             raise
         finally:
-            # 推論状態をリセット
-            self.reset_inference_state()
+            # ここで取得した実行権のみ解放する（呼び出し側が取得した場合は呼び出し側が解放）
+            if not acquired:
+                self.reset_inference_state()
     
     async def _fetch_market_data(self) -> Dict[str, Any]:
         """
@@ -107,31 +140,46 @@ class InferenceService:
             "trends": {}
         }
     
+    def _get_simulator(self):
+        """
+        SlackForexSimulator を取得（初回のみモジュールの読み込みと設定ファイルの解析を行い、以降は使い回す）
+        
+        Raises:
+            ImportError: llm_forex_slack_simulator が見つからない場合
+        """
+        simulator = InferenceService._simulator
+        if simulator is not None:
+            return simulator
+        
+        # 初期化は await を挟まずに行い、推論の実行権で同時に1件に制限されているのでロックは不要
+        simulator_path = _SIMULATOR_PATH
+        if not os.path.exists(simulator_path):
+            simulator_path = _SIMULATOR_FALLBACK_PATH
+        if not os.path.exists(simulator_path):
+            raise ImportError("llm_forex_slack_simulator が見つかりません")
+        
+        simulator_path = os.path.abspath(simulator_path)
+        if simulator_path not in sys.path:
+            sys.path.insert(0, simulator_path)
+        from slack_simulator import SlackForexSimulator
+        logger.info("実取引データ推論モジュールを正常に読み込みました")
+        
+        InferenceService._simulator = SlackForexSimulator(_SIMULATOR_CONFIG_PATH)
+        return InferenceService._simulator
+    
     async def _execute_real_data_inference(self, current_balance: Dict[str, float], market_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         llm_forex_slack_simulator を使用した実取引データ推論実行
         """
         try:
             logger.info("[inference_service] 実取引データによる推論を実行中... (_execute_real_data_inference)")
-            print("[inference_service] _execute_real_data_inference: SlackForexSimulator呼び出し直前")
             
             # 必要なモジュールをインポート
             import datetime as dt
             
-            # llm_forex_slack_simulatorのパス（実取引データ専用）
-            SlackForexSimulator = None
+            # 実取引データ推論モジュール（初回のみ読み込み）
             try:
-                simulator_path = os.path.join(os.path.dirname(__file__), '..', '..', 'llm_forex_slack_simulator')
-                if not os.path.exists(simulator_path):
-                    simulator_path = '/mnt/bigdata/00_students/mattsun_ucl/workspace/forex/llm_forex_slack_simulator'
-                
-                if os.path.exists(simulator_path):
-                    sys.path.insert(0, os.path.abspath(simulator_path))
-                    from slack_simulator import SlackForexSimulator
-                    logger.info("実取引データ推論モジュールを正常に読み込みました")
-                else:
-                    raise ImportError("llm_forex_slack_simulator が見つかりません")
-                    
+                simulator = self._get_simulator()
             except ImportError as import_error:
                 logger.warning(f"実取引データ推論のインポートに失敗: {import_error}")
                 return await self._fallback_inference_model(current_balance, market_data)
@@ -147,14 +195,14 @@ class InferenceService:
             
             logger.info(f"実取引データ推論開始: {current_time_utc}")
             logger.info(f"出力ディレクトリ: {output_dir}")
-            print("[inference_service] _execute_real_data_inference: SlackForexSimulatorインスタンス化直前")
-            simulator = SlackForexSimulator("/mnt/bigdata/00_students/mattsun_ucl/workspace/forex/llm_forex_slack_simulator/config/config.json")
-            print("[inference_service] _execute_real_data_inference: run_inference呼び出し直前")
-            logger.info("[inference_service] run_inference呼び出し直前 (llm_forex_slack_simulator側)")
+            logger.debug("[inference_service] _execute_real_data_inference: run_inference呼び出し直前 (llm_forex_slack_simulator側)")
             # 推論を実行（現在時刻での推論）
-            inference_result = simulator.run_inference(current_time=current_time_utc, output_dir=output_dir)
-            print("[inference_service] _execute_real_data_inference: run_inference呼び出し直後")
-            logger.info("[inference_service] run_inference呼び出し直後 (llm_forex_slack_simulator側)")
+            # 同期処理のためワーカースレッドで実行し、その間もイベントループを塞がない
+            # 同時実行は推論の実行権（try_acquire_inference）で1件に制限されている
+            inference_result = await asyncio.to_thread(
+                simulator.run_inference, current_time=current_time_utc, output_dir=output_dir
+            )
+            logger.debug("[inference_service] _execute_real_data_inference: run_inference呼び出し直後 (llm_forex_slack_simulator側)")
             # 結果を解析
             result = {
                 "inference_result": inference_result,
@@ -163,21 +211,13 @@ class InferenceService:
                 "data_source": "real_trading_data"
             }
             logger.info("[inference_service] 実取引データ推論が完了しました (_execute_real_data_inference)")
-            print("[inference_service] _execute_real_data_inference: 完了")
             return result
         except Exception as e:
             logger.error(f"[inference_service] 実取引データ推論中にエラー: {e}")
-            print(f"[inference_service] _execute_real_data_inference: 例外発生: {e}")
             # Slack通知（失敗時）
-            try:
-                from llm_forex_slack_simulator.slack_client import SlackBotClient
-                slack_client = SlackBotClient(slack_bot_path="../forex_slack_bot")
-                slack_client.send_inference_results({"error": f"inference_service._execute_real_data_inference例外: {e}"})
-            except Exception as ee:
-                logger.error(f"[inference_service] Slack通知失敗: {ee}")
+            await asyncio.to_thread(_notify_inference_error, f"inference_service._execute_real_data_inference例外: {e}")
             # フォールバック処理
             return await self._fallback_inference_model(current_balance, market_data)
-            return await self._fallback_inference_model(current_balance, market_data)
     
     async def _fallback_inference_model(self, current_balance: Dict[str, float], market_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -235,27 +275,16 @@ class InferenceService:
             if eur_amount > 0:
                 total_jpy += eur_amount * 160  # 概算レート
                 
-            analysis_lines.append(f"現在の総資産価値（概算）: ¥{total_jpy:,.2f}")
-            analysis_lines.append("")
+            analysis_lines.extend((f"現在の総資産価値（概算）: ¥{total_jpy:,.2f}", ""))
             
-            # 取引履歴ファイルの簡易チェック
-            transaction_log = os.path.join(os.path.dirname(__file__), '..', 'data', 'transaction_log.json')
-            if os.path.exists(transaction_log):
-                import json
-                
-                transaction_count = 0
-                with open(transaction_log, 'r', encoding='utf-8') as f:
-                    for line in f:
-                        line = line.strip()
-                        if line:
-                            transaction_count += 1
-                
-                analysis_lines.append(f"総取引記録件数: {transaction_count}")
+            # 取引件数はキャッシュ済みの取引統計から取る（書き出し待ち・アーカイブ分を含み、墓標レコードは含まない）
+            stats = await asyncio.to_thread(self.trading_service.get_transaction_statistics)
+            if stats:
+                analysis_lines.append(f"総取引記録件数: {stats['total_transactions']}")
             else:
-                analysis_lines.append("取引履歴ファイルが見つかりません")
+                analysis_lines.append("取引履歴を取得できませんでした")
             
-            analysis_lines.append("")
-            analysis_lines.append("注意: 実取引推論システムが利用できないため簡易分析を実行")
+            analysis_lines.extend(("", "注意: 実取引推論システムが利用できないため簡易分析を実行"))
             
             return "\n".join(analysis_lines)
             
@@ -270,20 +299,26 @@ class InferenceService:
         推論結果をフォーマット（実取引データ専用）
         """
         try:
+            # 何度も参照するキーは最初に一度だけ取り出す
+            get = raw_result.get
+            data_source = get("data_source")
+            inference_data = get("inference_result")
+            model_prediction = get("model_prediction")
+            simulation_analysis = get("simulation_analysis")
+            
+            recommended_trades = []
             formatted_result = {
                 "timestamp": datetime.now().isoformat(),
                 "current_balance": current_balance,
                 "market_data": market_data,
-                "recommended_trades": [],
+                "recommended_trades": recommended_trades,
                 "market_analysis": "",
                 "risk_assessment": "",
-                "data_source": raw_result.get("data_source", "real_trading_data")
+                "data_source": data_source if data_source is not None else "real_trading_data"
             }
             
             # 推論結果から推奨取引を取得
-            if "inference_result" in raw_result and isinstance(raw_result["inference_result"], dict):
-                inference_data = raw_result["inference_result"]
-                
+            if isinstance(inference_data, dict):
                 # 推奨取引の抽出
                 if "recommended_actions" in inference_data:
                     formatted_result["recommended_trades"] = inference_data["recommended_actions"]
@@ -293,35 +328,36 @@ class InferenceService:
                         inference_data["analysis_result"], current_balance
                     )
             
-            elif "model_prediction" in raw_result:
+            elif model_prediction is not None:
                 # フォールバック推論の結果から推奨取引を生成
-                for pair, prediction in raw_result["model_prediction"].items():
-                    if prediction["action"] in ["buy", "sell"] and prediction["confidence"] > 0.4:
-                        trade = {
+                for pair, prediction in model_prediction.items():
+                    action = prediction["action"]
+                    confidence = prediction["confidence"]
+                    if action in ("buy", "sell") and confidence > 0.4:
+                        recommended_trades.append({
                             "pair": pair,
-                            "action": prediction["action"],
+                            "action": action,
                             "rate": prediction.get("predicted_price", 0),
                             "amount": self._calculate_suggested_amount(pair, current_balance, prediction),
-                            "confidence": prediction["confidence"],
-                            "reasoning": f"実取引データ分析により{prediction['action']}を推奨 (信頼度: {prediction['confidence']*100:.0f}%)"
-                        }
-                        formatted_result["recommended_trades"].append(trade)
+                            "confidence": confidence,
+                            "reasoning": f"実取引データ分析により{action}を推奨 (信頼度: {confidence*100:.0f}%)"
+                        })
             
             # 市場分析を生成
-            if "simulation_analysis" in raw_result:
-                formatted_result["market_analysis"] = raw_result["simulation_analysis"]
+            if simulation_analysis is not None:
+                formatted_result["market_analysis"] = simulation_analysis
             else:
                 formatted_result["market_analysis"] = self._generate_market_analysis(market_data, raw_result)
             
             # リスク評価を生成
-            risk_factors = raw_result.get("risk_factors", [])
+            risk_factors = get("risk_factors", [])
             if risk_factors:
                 formatted_result["risk_assessment"] = "検出されたリスクファクター:\n• " + "\n• ".join(risk_factors)
             else:
                 formatted_result["risk_assessment"] = "実取引データに基づく分析では特筆すべきリスクファクターは検出されていません。"
             
             # 実取引データ特有の情報を追加
-            if raw_result.get("data_source") == "real_trading_data":
+            if data_source == "real_trading_data":
                 formatted_result["real_data_summary"] = "実際の取引記録と残高データを基にした推論結果"
                 formatted_result["confidence_boost"] = 0.1  # 実データの場合は信頼度を若干向上
             
@@ -337,34 +373,16 @@ class InferenceService:
         """
         recommendations = []
         
-        # 簡易的なキーワードマッチング
-        lines = analysis_text.split('\n')
-        
-        for line in lines:
-            line = line.strip()
-            if '推奨' in line or '推薦' in line:
-                # 取引推奨を含む行を解析
-                if 'USDJPY' in line:
-                    action = 'buy' if ('買' in line or 'BUY' in line) else 'sell' if ('売' in line or 'SELL' in line) else 'hold'
-                    if action in ['buy', 'sell']:
-                        recommendations.append({
-                            "pair": "USDJPY",
-                            "action": action,
-                            "confidence": 0.8,
-                            "reasoning": line,
-                            "amount": self._calculate_safe_amount("USD", current_balance)
-                        })
-                
-                elif 'EURJPY' in line:
-                    action = 'buy' if ('買' in line or 'BUY' in line) else 'sell' if ('売' in line or 'SELL' in line) else 'hold'
-                    if action in ['buy', 'sell']:
-                        recommendations.append({
-                            "pair": "EURJPY",
-                            "action": action,
-                            "confidence": 0.8,
-                            "reasoning": line,
-                            "amount": self._calculate_safe_amount("EUR", current_balance)
-                        })
+        # 推奨を含み、通貨ペアと売買の向きが読み取れる行だけを1回の走査で拾う
+        for match in _REC_RE.finditer(analysis_text):
+            pair, currency = ("USDJPY", "USD") if match.group("usd") else ("EURJPY", "EUR")
+            recommendations.append({
+                "pair": pair,
+                "action": "buy" if match.group("buy") else "sell",
+                "confidence": 0.8,
+                "reasoning": match.group().strip(),
+                "amount": self._calculate_safe_amount(currency, current_balance)
+            })
         
         return recommendations
     
@@ -392,10 +410,7 @@ class InferenceService:
         """
         市場分析テキストを生成
         """
-        analysis_lines = []
-        
-        analysis_lines.append(f"分析時刻: {market_data.get('timestamp', 'N/A')}")
-        analysis_lines.append("")
+        analysis_lines = [f"分析時刻: {market_data.get('timestamp', 'N/A')}", ""]
         
         # データソース情報
         data_source = raw_result.get("data_source", "unknown")
@@ -407,10 +422,10 @@ class InferenceService:
         analysis_lines.append("")
         
         # レート情報
-        if market_data.get("rates"):
+        rates = market_data.get("rates")
+        if rates:
             analysis_lines.append("現在のレート:")
-            for pair, rate in market_data["rates"].items():
-                analysis_lines.append(f"  {pair}: {rate:.2f}")
+            analysis_lines.extend(f"  {pair}: {rate:.2f}" for pair, rate in rates.items())
             analysis_lines.append("")
         
         # 全体的な信頼度
@@ -3,23 +3,89 @@
 """
 
 import asyncio
+import importlib.util
 import logging
-import aiohttp
+import sys
+import threading
+import time
+from functools import lru_cache
 from datetime import datetime, timedelta
 from typing import Dict, Optional, List, Any
 import json
+import random
+
+try:
+    import numpy as np
+except ImportError:  # numpy が無い環境では random で1件ずつ生成する
+    np = None
 
 from config import Config
 
 logger = logging.getLogger(__name__)
 
+# レート取得に使う llm_forex_simulator の fetch.py
+_FETCH_PATH = "/mnt/bigdata/00_students/mattsun_ucl/workspace/forex/llm_forex_simulator/forex_simulator/script/fetch.py"
+# APIから取得できないときに使う固定レート（呼び出しのたびに辞書を作らないようモジュールで保持）
+FALLBACK_RATES: Dict[str, float] = {
+    "USDJPY": 150.0,
+    "EURJPY": 165.0,
+    "GBPJPY": 190.0,
+    "AUDJPY": 100.0,
+    "CHFJPY": 170.0,
+    "CADJPY": 110.0,
+    "EURUSD": 1.10,
+    "GBPUSD": 1.27,
+    "AUDUSD": 0.67,
+    "USDCHF": 0.88,
+    "USDCAD": 1.36,
+}
+# レートを扱える通貨ペア（事前の妥当性チェック用）
+SUPPORTED_PAIRS: frozenset = frozenset(FALLBACK_RATES)
+
+# 模擬履歴データ用の乱数生成器（numpy がある場合のみ。毎回作らず使い回す）
+_rng = np.random.default_rng() if np is not None else None
+
+# 読み込み済みの fetch モジュール（初回のみ読み込み、以降は使い回す）
+_fetch_module = None
+_fetch_module_lock = threading.Lock()
+# キャッシュに無いことを表す目印（None は「直近の取得に失敗した」ことを表す）
+_NOT_CACHED = object()
+
+
+def _load_fetch_module():
+    """
+    fetch.py を読み込んで返す（2回目以降は読み込み済みのモジュールを返す）
+    """
+    global _fetch_module
+    module = _fetch_module
+    if module is not None:
+        return module
+    
+    with _fetch_module_lock:
+        if _fetch_module is None:
+            spec = importlib.util.spec_from_file_location("fetch_module", _FETCH_PATH)
+            module = importlib.util.module_from_spec(spec)
+            sys.modules["fetch_module"] = module
+            spec.loader.exec_module(module)
+            _fetch_module = module
+        return _fetch_module
+
+
+def _fetch_forex_technicals(symbol: str) -> Dict[str, Any]:
+    """
+    fetch_forex_technicals で現在時刻までのデータを取得（ネットワークI/Oを伴うためワーカースレッドで実行）
+    """
+    return _load_fetch_module().fetch_forex_technicals(symbol, datetime.now(), save_to_file=False)
+
+
 class RateService:
     """為替レート取得サービス"""
     
     def __init__(self):
-        self._rate_cache = {}
-        self._cache_expiry = {}
-        self._cache_duration_minutes = 5  # キャッシュ有効期間
+        # 通貨ペア -> (レート, 有効期限[time.monotonic()基準])。取得失敗はレートを None として短期間だけ覚える
+        self._rate_cache: Dict[str, tuple] = {}
+        self._cache_duration_seconds = 300.0  # キャッシュ有効期間（5分）
+        self._failure_cache_seconds = 30.0  # 取得失敗を覚えておく期間（障害中にAPIを連打しない）
         
     async def get_current_rate(self, currency_pair: str) -> Optional[float]:
         """
@@ -32,17 +98,14 @@ class RateService:
             現在のレート、取得できない場合はNone
         """
         try:
-            # キャッシュをチェック
-            cached_rate = self._get_cached_rate(currency_pair)
-            if cached_rate is not None:
-                return cached_rate
-            
-            # 外部APIからレートを取得
-            rate = await self._fetch_rate_from_api(currency_pair)
+            # キャッシュをチェック（直近で失敗していればAPIは呼ばずにフォールバックへ）
+            rate = self._get_cached_rate(currency_pair)
+            if rate is _NOT_CACHED:
+                # 外部APIからレートを取得し、失敗した場合もその結果をキャッシュに保存
+                rate = await self._fetch_rate_from_api(currency_pair)
+                self._cache_rate(currency_pair, rate)
             
             if rate is not None:
-                # キャッシュに保存
-                self._cache_rate(currency_pair, rate)
                 return rate
             
             # APIが失敗した場合、フォールバックレートを使用
@@ -100,70 +163,57 @@ class RateService:
         """
         複数の通貨ペアのレートを一括取得
         """
-        results = {}
-        
-        # 並行してレートを取得
-        tasks = []
-        for pair in currency_pairs:
-            task = asyncio.create_task(self.get_current_rate(pair))
-            tasks.append((pair, task))
+        # 重複を除いた通貨ペアを並行して取得（順序は保つ）
+        unique_pairs = list(dict.fromkeys(currency_pairs))
+        rates = await asyncio.gather(
+            *(self.get_current_rate(pair) for pair in unique_pairs),
+            return_exceptions=True
+        )
         
-        for pair, task in tasks:
-            try:
-                rate = await task
-                results[pair] = rate
-            except Exception as e:
-                logger.error(f"{pair}のレート取得でエラー: {e}")
-                results[pair] = None
+        results = {}
+        for pair, rate in zip(unique_pairs, rates):
+            if isinstance(rate, Exception):
+                logger.error(f"{pair}のレート取得でエラー: {rate}")
+                rate = None
+            results[pair] = rate
         
         return results
     
-    def _get_cached_rate(self, currency_pair: str) -> Optional[float]:
+    def _get_cached_rate(self, currency_pair: str):
         """
         キャッシュからレートを取得
+        キャッシュに無い場合は _NOT_CACHED、直近の取得に失敗している場合は None を返す
         """
-        if currency_pair not in self._rate_cache:
-            return None
+        entry = self._rate_cache.get(currency_pair)
+        if entry is None:
+            return _NOT_CACHED
         
-        expiry_time = self._cache_expiry.get(currency_pair)
-        if expiry_time is None or datetime.now() > expiry_time:
+        if entry[1] <= time.monotonic():
             # キャッシュが期限切れ
             self._rate_cache.pop(currency_pair, None)
-            self._cache_expiry.pop(currency_pair, None)
-            return None
+            return _NOT_CACHED
         
-        return self._rate_cache[currency_pair]
+        return entry[0]
     
-    def _cache_rate(self, currency_pair: str, rate: float):
+    def _cache_rate(self, currency_pair: str, rate: Optional[float]):
         """
-        レートをキャッシュに保存
+        レートをキャッシュに保存（取得失敗の None は短い期間だけ保存）
         """
-        self._rate_cache[currency_pair] = rate
-        self._cache_expiry[currency_pair] = datetime.now() + timedelta(minutes=self._cache_duration_minutes)
+        duration = self._cache_duration_seconds if rate is not None else self._failure_cache_seconds
+        self._rate_cache[currency_pair] = (rate, time.monotonic() + duration)
     
     async def _fetch_rate_from_api(self, currency_pair: str) -> Optional[float]:
         """
         llm_forex_simulatorのfetch_forex_technicalsを使ってレートを取得
         """
         try:
-            import importlib.util
-            import sys
-            from datetime import datetime
-            # fetch.pyのパス
-            fetch_path = "/mnt/bigdata/00_students/mattsun_ucl/workspace/forex/llm_forex_simulator/forex_simulator/script/fetch.py"
-            spec = importlib.util.spec_from_file_location("fetch_module", fetch_path)
-            fetch_module = importlib.util.module_from_spec(spec)
-            sys.modules["fetch_module"] = fetch_module
-            spec.loader.exec_module(fetch_module)
-
             # 通貨ペアをyfinance形式に変換（例: USDJPY -> USDJPY=X）
             if not currency_pair.endswith("=X"):
                 symbol = currency_pair + "=X"
             else:
                 symbol = currency_pair
-            now = datetime.now()
-            # fetch_forex_technicalsでデータ取得
-            result = fetch_module.fetch_forex_technicals(symbol, now, save_to_file=False)
+            # fetch_forex_technicalsでデータ取得（モジュールの初回読み込みも含めてイベントループ外で行う）
+            result = await asyncio.to_thread(_fetch_forex_technicals, symbol)
             # 最新のhourlyデータのcloseを取得
             hourly = result.get("hourly", [])
             if hourly and isinstance(hourly, list):
@@ -189,8 +239,12 @@ class RateService:
             if current_rate is None:
                 return None
             
-            # 簡単な模擬履歴データ
-            import random
+            # 簡単な模擬履歴データ（±2%の変動を累積）
+            if _rng is not None:
+                # 変動率の生成と累積をまとめて配列演算で行う
+                variations = 1 + _rng.uniform(-0.02, 0.02, size=hours)
+                return (current_rate * np.cumprod(variations)).tolist()
+            
             historical_rates = []
             base_rate = current_rate
             
@@ -212,28 +266,13 @@ class RateService:
         フォールバックレートを取得（固定値）
         実際の運用では、より信頼性の高いソースを使用
         """
-        fallback_rates = {
-            "USDJPY": 150.0,
-            "EURJPY": 165.0,
-            "GBPJPY": 190.0,
-            "AUDJPY": 100.0,
-            "CHFJPY": 170.0,
-            "CADJPY": 110.0,
-            "EURUSD": 1.10,
-            "GBPUSD": 1.27,
-            "AUDUSD": 0.67,
-            "USDCHF": 0.88,
-            "USDCAD": 1.36,
-        }
-        
-        return fallback_rates.get(currency_pair)
+        return FALLBACK_RATES.get(currency_pair)
     
     def clear_cache(self):
         """
         レートキャッシュをクリア
         """
         self._rate_cache.clear()
-        self._cache_expiry.clear()
         logger.info("レートキャッシュをクリアしました")
     
     def get_cache_status(self) -> Dict[str, Any]:
@@ -246,11 +285,20 @@ class RateService:
             "cache_expiry_times": {}
         }
         
-        for pair, expiry in self._cache_expiry.items():
-            remaining = expiry - datetime.now()
+        # 有効期限は単調時計で持っているので、表示用の時刻は残り秒数から求める
+        now = datetime.now()
+        now_monotonic = time.monotonic()
+        for pair, (_, expiry) in self._rate_cache.items():
+            remaining = max(0.0, expiry - now_monotonic)
             status["cache_expiry_times"][pair] = {
-                "expires_at": expiry.isoformat(),
-                "remaining_seconds": max(0, int(remaining.total_seconds()))
+                "expires_at": (now + timedelta(seconds=remaining)).isoformat(),
+                "remaining_seconds": int(remaining)
             }
         
-        return status
\ No newline at end of file
+        return status
+
+
+@lru_cache(maxsize=1)
+def get_rate_service() -> RateService:
+    """プロセス共有のRateServiceを取得（レートキャッシュを推論・ハンドラー間で共有する）"""
+    return RateService()
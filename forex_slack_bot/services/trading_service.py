@@ -4,6 +4,7 @@
 
 import logging
 from datetime import datetime
+from functools import lru_cache
 from typing import Dict, List, Optional, Any
 
 from models.balance_manager import BalanceManager
@@ -31,6 +32,12 @@ class TradingService:
         """
         return self.transaction_log.get_logs(limit=limit)
     
+    def get_transaction_statistics(self) -> Dict[str, Any]:
+        """
+        取引統計を取得（アーカイブ分を含む。取り消しの墓標レコードは件数に含まない）
+        """
+        return self.transaction_log.get_statistics()
+    
     async def execute_trade(self, currency_pair: str, amount: float, rate: float, user_id: str) -> Dict[str, Any]:
         """
         取引を実行
@@ -82,8 +89,12 @@ class TradingService:
             # 取引を実行
             new_balance = self._execute_trade_logic(current_balance, currency_pair, amount, rate)
             
-            # 残高を更新
-            self.balance_manager.update_balance(new_balance)
+            # 残高を更新（成功を返す前にファイルへ書き出す）
+            if not self.balance_manager.update_balance(new_balance, durable=True):
+                return {
+                    "success": False,
+                    "error": "残高の保存に失敗しました"
+                }
             
             # 取引ログに記録
             self.transaction_log.add_transaction({
@@ -144,8 +155,12 @@ class TradingService:
                 last_transaction["rate"]
             )
             
-            # 残高を更新
-            self.balance_manager.update_balance(new_balance)
+            # 残高を更新（成功を返す前にファイルへ書き出す）
+            if not self.balance_manager.update_balance(new_balance, durable=True):
+                return {
+                    "success": False,
+                    "error": "残高の保存に失敗しました"
+                }
             
             # 元の取引を取り消し済みにマーク
             self.transaction_log.mark_transaction_undone(last_transaction["id"])
@@ -208,8 +223,12 @@ class TradingService:
                 original_transaction["rate"]
             )
             
-            # 残高を更新
-            self.balance_manager.update_balance(new_balance)
+            # 残高を更新（成功を返す前にファイルへ書き出す）
+            if not self.balance_manager.update_balance(new_balance, durable=True):
+                return {
+                    "success": False,
+                    "error": "残高の保存に失敗しました"
+                }
             
             # やり直しログを追加
             self.transaction_log.add_transaction({
@@ -246,7 +265,11 @@ class TradingService:
             
             # 新しい残高を設定
             current_balance[currency] = new_amount
-            self.balance_manager.update_balance(current_balance)
+            if not self.balance_manager.update_balance(current_balance, durable=True):
+                return {
+                    "success": False,
+                    "error": "残高の保存に失敗しました"
+                }
             
             # 上書きログを追加
             self.transaction_log.add_transaction({
@@ -344,4 +367,10 @@ class TradingService:
         取引情報を簡潔にフォーマット
         """
         amount_str = f"+{transaction['amount']}" if transaction['amount'] > 0 else str(transaction['amount'])
-        return f"{transaction['currency_pair']}: {amount_str} @ {transaction['rate']}"
\ No newline at end of file
+        return f"{transaction['currency_pair']}: {amount_str} @ {transaction['rate']}"
+
+
+@lru_cache(maxsize=1)
+def get_trading_service() -> TradingService:
+    """プロセス共有のTradingServiceを取得"""
+    return TradingService()
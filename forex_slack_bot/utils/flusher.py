@@ -0,0 +1,43 @@
+"""
+遅延フラッシャ - 短時間に続いた書き込みを1回のファイル書き込みにまとめる
+"""
+
+import logging
+import threading
+import time
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+# 最初の書き込み要求から実際に書き出すまでの待ち時間（秒）
+FLUSH_INTERVAL = 0.05
+
+class DebouncedFlusher:
+    """
+    書き込み要求を受けると少し待ってから flush を呼ぶバックグラウンドスレッド
+    待っている間に届いた要求は同じ flush にまとめられる
+    """
+
+    def __init__(self, flush: Callable[[], None], name: str, interval: float = FLUSH_INTERVAL):
+        self._flush = flush
+        self._interval = interval
+        self._event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def notify(self):
+        """
+        書き出し待ちのデータがあることを通知
+        """
+        self._event.set()
+
+    def _run(self):
+        while True:
+            self._event.wait()
+            time.sleep(self._interval)
+            # flush より前にクリアし、flush 中に届いた要求は次の周回で拾う
+            self._event.clear()
+            try:
+                self._flush()
+            except Exception as e:
+                logger.error(f"バックグラウンド書き込み中にエラー: {e}")
@@ -2,9 +2,11 @@
 Slackユーティリティ - Slack APIとの連携ヘルパー
 """
 
+import asyncio
 import logging
 import os
-from typing import Optional, Dict, Any
+from functools import lru_cache
+from typing import Optional, Dict, Any, BinaryIO
 from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
 
@@ -12,8 +14,19 @@ from config import Config
 
 logger = logging.getLogger(__name__)
 
+
+def is_dm_channel_id(channel_id: Optional[str]) -> bool:
+    """
+    チャンネルIDがDMかどうかを判定（DMのチャンネルIDは"D"で始まる）
+    """
+    return bool(channel_id) and channel_id[0] == "D"
+
+
 class SlackUtils:
-    """Slack API連携ユーティリティクラス"""
+    """
+    Slack API連携ユーティリティクラス
+    WebClient は同期クライアントなので、async メソッドではワーカースレッドで呼び出しイベントループを塞がない
+    """
     
     def __init__(self):
         self.client = WebClient(token=Config.SLACK_BOT_TOKEN)
@@ -31,7 +44,8 @@ class SlackUtils:
             送信成功の場合True
         """
         try:
-            response = self.client.chat_postMessage(
+            response = await asyncio.to_thread(
+                self.client.chat_postMessage,
                 channel=channel_id,
                 text=text,
                 **kwargs
@@ -51,34 +65,38 @@ class SlackUtils:
             logger.error(f"メッセージ送信中にエラー: {e}")
             return False
     
-    async def send_message_with_file(self, channel_id: str, text: str, file_path: str, 
-                                   filename: Optional[str] = None, **kwargs) -> bool:
+    async def send_message_with_file(self, channel_id: str, text: str, file_path: Optional[str] = None,
+                                   filename: Optional[str] = None, file_obj: Optional[BinaryIO] = None,
+                                   **kwargs) -> bool:
         """
         ファイル添付付きメッセージを送信
         
         Args:
             channel_id: 送信先チャンネルID
             text: メッセージテキスト
-            file_path: 添付ファイルのパス
+            file_path: 添付ファイルのパス（file_obj 未指定時に使用）
             filename: 表示用ファイル名
+            file_obj: 添付内容のバイナリストリーム（指定時はディスクを経由しない）
             **kwargs: その他のパラメータ
             
         Returns:
             送信成功の場合True
         """
         try:
-            if not os.path.exists(file_path):
-                logger.error(f"添付ファイルが見つかりません: {file_path}")
-                return False
-            
-            # ファイル名を設定
-            if filename is None:
-                filename = os.path.basename(file_path)
+            if file_obj is None:
+                if not file_path or not os.path.exists(file_path):
+                    logger.error(f"添付ファイルが見つかりません: {file_path}")
+                    return False
+                
+                # ファイル名を設定
+                if filename is None:
+                    filename = os.path.basename(file_path)
             
             # ファイルをアップロード
-            response = self.client.files_upload_v2(
+            response = await asyncio.to_thread(
+                self.client.files_upload_v2,
                 channel=channel_id,
-                file=file_path,
+                file=file_obj if file_obj is not None else file_path,
                 filename=filename,
                 initial_comment=text,
                 **kwargs
@@ -88,7 +106,7 @@ class SlackUtils:
                 logger.debug(f"ファイル付きメッセージを送信しました: {channel_id}, {filename}")
                 
                 # 一時ファイルの場合は削除
-                if "/tmp/" in file_path or "temp" in file_path.lower():
+                if file_obj is None and ("/tmp/" in file_path or "temp" in file_path.lower()):
                     try:
                         os.remove(file_path)
                         logger.debug(f"一時ファイルを削除しました: {file_path}")
@@ -121,7 +139,7 @@ class SlackUtils:
         """
         try:
             # DMチャンネルを開く
-            dm_response = self.client.conversations_open(users=[user_id])
+            dm_response = await asyncio.to_thread(self.client.conversations_open, users=[user_id])
             
             if not dm_response["ok"]:
                 logger.error(f"DMチャンネルオープンに失敗: {dm_response.get('error', 'Unknown error')}")
@@ -225,7 +243,8 @@ class SlackUtils:
             追加成功の場合True
         """
         try:
-            response = self.client.reactions_add(
+            response = await asyncio.to_thread(
+                self.client.reactions_add,
                 channel=channel_id,
                 timestamp=timestamp,
                 name=name
@@ -257,7 +276,7 @@ class SlackUtils:
         """
         try:
             # DMのチャンネルIDは"D"で始まる
-            if channel_id.startswith("D"):
+            if is_dm_channel_id(channel_id):
                 return True
             
             # より確実にチェックするため、チャンネル情報を取得
@@ -363,4 +382,10 @@ class SlackUtils:
             return None
         except Exception as e:
             logger.error(f"Bot情報取得中にエラー: {e}")
-            return None
\ No newline at end of file
+            return None
+
+
+@lru_cache(maxsize=1)
+def get_slack_utils() -> SlackUtils:
+    """プロセス共有のSlackUtils（WebClient）を取得"""
+    return SlackUtils()